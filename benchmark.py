@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+Headless benchmarks for ClutterScope's rendering and data paths
+Copyright (C) 2011  Leo Singer
+
+Times the numerical work that happens on every frame -- building trace paths,
+generating the graticule, decimating, and triggering -- over a matrix of sample
+counts, trace counts, and stage sizes, without opening a display. Results are
+written as JSON so that runs from different commits can be compared:
+
+	python benchmark.py -o before.json
+	(check out another commit)
+	python benchmark.py -o after.json --compare before.json
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import json
+import optparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import numpy
+import clutterscope
+from clutterscope import parallel, raster, recording
+
+
+"""Full and quick parameter matrices"""
+MATRIX = {
+	'samples': [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7],
+	'traces': [1, 16, 128],
+	'stage_sizes': [(576, 576), (1920, 1080), (3840, 2160)],
+}
+QUICK_MATRIX = {
+	'samples': [10 ** 3, 10 ** 5],
+	'traces': [1, 16],
+	'stage_sizes': [(576, 576)],
+}
+
+"""Number of samples per block for streaming benchmarks"""
+BLOCK_SIZE = 4096
+
+
+def measure(func, repeat=5, min_time=0.05):
+	"""Return the best time in seconds for one call of func, calling it enough
+	times per repetition that each repetition takes at least min_time."""
+	number = 1
+	while True:
+		elapsed = timeit.timeit(func, number=number)
+		if elapsed >= min_time or number >= 1 << 20:
+			break
+		number *= 2
+	times = [elapsed] + timeit.repeat(func, number=number, repeat=repeat - 1)
+	return min(times) / number
+
+
+def zoom_to_fit(samples, width):
+	"""Return the highest scale level at which samples fit across width
+	pixels."""
+	level = 0
+	while samples / clutterscope.samples_per_pixel(level) > width:
+		level -= 1
+	return level
+
+
+def filled_trace_data(samples, pyramid=True):
+	"""Return a RingBuffer of the given number of samples of noise with a few
+	gaps in it, and a MinMaxPyramid over it if pyramid is true."""
+	buffer = clutterscope.RingBuffer(samples)
+	data = numpy.random.RandomState(0).standard_normal(samples)
+	data[::10007] = numpy.nan
+	if pyramid:
+		pyramid = clutterscope.MinMaxPyramid(buffer)
+		for k in range(0, samples, 1 << 16):
+			block = data[k:k + (1 << 16)]
+			buffer.append(block)
+			pyramid.update(k, k + len(block))
+	else:
+		buffer.append(data)
+		pyramid = None
+	return buffer, pyramid
+
+
+def bench_trace_paint(matrix):
+	"""Path construction for all traces, as in PathTraceRenderer.paint, at
+	the zoom level at which each trace's whole buffer fits the stage."""
+	for samples in matrix['samples']:
+		buffer, pyramid = filled_trace_data(samples)
+		for w, h in matrix['stage_sizes']:
+			bucket = clutterscope.samples_per_pixel(zoom_to_fit(samples, w))
+			for traces in matrix['traces']:
+				def paint():
+					vertices = 0
+					for _ in range(traces):
+						i, y = clutterscope.trace_envelope(buffer, pyramid, 0, samples, bucket)
+						for x, y in clutterscope.finite_runs(i.astype(float), y):
+							vertices += len(clutterscope.polyline_coords(x, y)) // 2
+					return vertices
+				yield 'trace_paint', dict(samples=samples, traces=traces, width=w, height=h, bucket=bucket), paint
+
+
+def bench_collection(matrix):
+	"""Vertex generation for all channels of a TraceCollection in one batch,
+	as in TraceCollection.do_paint, at the zoom level at which the buffer fits
+	the stage."""
+	for samples in matrix['samples']:
+		for traces in matrix['traces']:
+			if samples * traces > 10 ** 7:
+				continue
+			buffer = clutterscope.RingBuffer(samples, channels=traces)
+			pyramid = clutterscope.MinMaxPyramid(buffer)
+			data = numpy.random.RandomState(0).standard_normal((traces, samples))
+			data[:, ::10007] = numpy.nan
+			buffer.append(data)
+			pyramid.update(0, samples)
+			colors = numpy.full((traces, 4), 255, dtype=numpy.uint8)
+			offsets = numpy.arange(traces, dtype=float)[:, numpy.newaxis]
+			for w, h in matrix['stage_sizes']:
+				bucket = clutterscope.samples_per_pixel(zoom_to_fit(samples, w))
+				def paint():
+					i, y = clutterscope.trace_envelope(buffer, pyramid, 0, samples, bucket)
+					return len(clutterscope.segment_vertices(i.astype(numpy.float32), offsets - y, colors))
+				yield 'collection_paint', dict(samples=samples, traces=traces, width=w, height=h, bucket=bucket), paint
+
+
+def bench_graticule(matrix):
+	"""Generation of the graticule's gridlines and ticks."""
+	for w, h in matrix['stage_sizes']:
+		yield 'graticule_lines', dict(width=w, height=h), \
+			lambda: clutterscope.graticule_lines(w, h, clutterscope.MAJOR_PIXELS)
+
+
+def bench_decimation(matrix):
+	"""Min/max decimation straight from the samples, from segments with gaps
+	between them, and from the pyramid, filtering a whole buffer with a
+	Resampler, and the cost of keeping the pyramid up to date as blocks
+	arrive."""
+	for samples in matrix['samples']:
+		buffer, pyramid = filled_trace_data(samples)
+		data = buffer.to_array()
+		# The same samples, with gaps between segments instead of NaN
+		segmented = clutterscope.SegmentedChannel()
+		for k in range(0, samples, 10007):
+			segmented.append(data[k + 1:k + 10007], k + 1)
+		for w, h in matrix['stage_sizes']:
+			bucket = clutterscope.samples_per_pixel(zoom_to_fit(samples, w))
+			params = dict(samples=samples, width=w, bucket=bucket)
+			yield 'minmax_envelope', params, \
+				lambda: clutterscope.minmax_envelope(data, 0, bucket)
+			yield 'segmented_envelope', params, \
+				lambda: clutterscope.trace_envelope(segmented, None, 0, samples, bucket)
+			if bucket > 1:
+				yield 'pyramid_envelope', params, \
+					lambda: pyramid.envelope(0, samples, bucket)
+				yield 'resampler_filter', params, \
+					lambda: clutterscope.Resampler(buffer).envelope(0, samples, bucket)
+
+		block = data[:BLOCK_SIZE]
+		def append():
+			start = buffer.total
+			buffer.append(block)
+			pyramid.update(start, buffer.total)
+		yield 'pyramid_append', dict(samples=samples, block=len(block)), append
+
+
+def bench_raster(matrix):
+	"""Software rendering of whole frames with all traces, as for batch
+	snapshots."""
+	for samples in matrix['samples']:
+		data = numpy.random.RandomState(0).standard_normal(samples)
+		for w, h in matrix['stage_sizes']:
+			level = zoom_to_fit(samples, w)
+			for traces in matrix['traces']:
+				frame = raster.RasterFrame([raster.RasterTrace(data, position=(0, k)) for k in range(traces)],
+					w, h, scale_level_x=level)
+				yield 'raster_frame', dict(samples=samples, traces=traces, width=w, height=h), \
+					lambda: raster.render_frame(frame)
+
+
+def bench_parallel(matrix):
+	"""Envelopes of all traces computed on a ChannelPool from shared-memory
+	buffers, as ClutterScope does once per frame when it has a pool, at the
+	zoom level at which each buffer fits the stage."""
+	pool = parallel.ChannelPool()
+	try:
+		for samples in matrix['samples']:
+			data = numpy.random.RandomState(0).standard_normal(samples)
+			for traces in matrix['traces']:
+				if samples * traces > 10 ** 8:
+					continue
+				buffers = [parallel.SharedRingBuffer(samples) for _ in range(traces)]
+				for buffer in buffers:
+					buffer.append(data)
+				for w, h in matrix['stage_sizes']:
+					bucket = clutterscope.samples_per_pixel(zoom_to_fit(samples, w))
+					yield 'pool_envelopes', dict(samples=samples, traces=traces, width=w, height=h, bucket=bucket), \
+						lambda: pool.envelopes(buffers, 0, samples, bucket)
+				for buffer in buffers:
+					buffer.close()
+	finally:
+		pool.close()
+
+
+def bench_trigger(matrix):
+	"""Trigger throughput over a noisy sine wave, streamed in blocks."""
+	for samples in matrix['samples']:
+		t = numpy.arange(samples)
+		data = numpy.sin(2 * numpy.pi * t / 1000.) + 0.1 * numpy.random.RandomState(0).standard_normal(samples)
+		for mode in (clutterscope.Trigger.EDGE, clutterscope.Trigger.PULSE):
+			trigger = clutterscope.Trigger(mode, level=0.5, hysteresis=0.2, holdoff=100)
+			def process():
+				trigger.reset()
+				for k in range(0, samples, BLOCK_SIZE):
+					trigger.process(data[k:k + BLOCK_SIZE], k)
+			yield 'trigger', dict(samples=samples, mode=mode, block=BLOCK_SIZE), process
+
+
+def bench_measurements(matrix):
+	"""Throughput of the streaming measurements over a noisy sine wave, in
+	blocks, and the cost of reading their results, as a label does."""
+	for samples in matrix['samples']:
+		t = numpy.arange(samples)
+		data = numpy.sin(2 * numpy.pi * t / 1000.) + 0.1 * numpy.random.RandomState(0).standard_normal(samples)
+		measurements = clutterscope.Measurements()
+		def process():
+			measurements.reset()
+			for k in range(0, samples, BLOCK_SIZE):
+				measurements.process(data[k:k + BLOCK_SIZE])
+		yield 'measurements', dict(samples=samples, block=BLOCK_SIZE), process
+	yield 'measurement_results', dict(), measurements.results
+
+
+def bench_recording(matrix):
+	"""Recording a stream of samples to a compressed file, in blocks, and
+	the zoomed-out envelope of the whole recording from its index."""
+	directory = tempfile.mkdtemp()
+	try:
+		for samples in matrix['samples']:
+			data = numpy.cumsum(numpy.random.RandomState(0).standard_normal(samples))
+			filename = os.path.join(directory, 'bench%s' % recording.Recorder.SUFFIX)
+			def record():
+				recorder = recording.Recorder(filename, chunk_samples=4 * BLOCK_SIZE)
+				for k in range(0, samples, BLOCK_SIZE):
+					recorder.append(data[k:k + BLOCK_SIZE])
+				recorder.close()
+			yield 'recording_write', dict(samples=samples, block=BLOCK_SIZE), record
+			channel = recording.RecordedChannel(filename)
+			for w, h in matrix['stage_sizes']:
+				bucket = max(4 * BLOCK_SIZE, clutterscope.samples_per_pixel(zoom_to_fit(samples, w)))
+				yield 'recording_summary', dict(samples=samples, width=w, bucket=bucket), \
+					lambda: channel.summary.envelope(0, samples, bucket)
+	finally:
+		shutil.rmtree(directory)
+
+
+def bench_math(matrix):
+	"""Incremental evaluation of a math channel over two streamed inputs, in
+	blocks."""
+	for samples in matrix['samples']:
+		data = numpy.random.RandomState(0).standard_normal((2, samples))
+		for expression in ('A - B', '0.5 * (A + B) * abs(A)'):
+			a = clutterscope.RingBuffer(BLOCK_SIZE)
+			b = clutterscope.RingBuffer(BLOCK_SIZE)
+			channel = clutterscope.MathChannel(expression, {'A': a, 'B': b})
+			def evaluate():
+				for k in range(0, samples, BLOCK_SIZE):
+					a.append(data[0, k:k + BLOCK_SIZE])
+					b.append(data[1, k:k + BLOCK_SIZE])
+					channel.update()
+			yield 'math_channel', dict(samples=samples, expression=expression, block=BLOCK_SIZE), evaluate
+
+
+BENCHMARKS = [bench_trace_paint, bench_collection, bench_graticule,
+	bench_decimation, bench_raster, bench_parallel, bench_trigger,
+	bench_measurements, bench_recording, bench_math]
+
+
+def run(matrix, repeat):
+	results = []
+	for benchmark in BENCHMARKS:
+		for name, params, func in benchmark(matrix):
+			seconds = measure(func, repeat)
+			result = dict(name=name, params=params, seconds=seconds)
+			if 'samples' in params and name != 'pyramid_append':
+				result['ns_per_sample'] = 1e9 * seconds / params['samples']
+			results.append(result)
+			sys.stderr.write('%-18s %-70s %12.3f us\n' % (name, json.dumps(params, sort_keys=True), 1e6 * seconds))
+	return results
+
+
+def key(result):
+	return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(results, baseline):
+	"""Write a table of the ratio of each result's time to its baseline."""
+	base = dict((key(result), result['seconds']) for result in baseline['results'])
+	for result in results:
+		k = key(result)
+		if k in base:
+			sys.stdout.write('%-18s %-70s %6.2fx\n' % (k[0], k[1], result['seconds'] / base[k]))
+
+
+def main():
+	parser = optparse.OptionParser(usage='%prog [options]')
+	parser.add_option('-o', '--output', help='write JSON results to this file instead of stdout')
+	parser.add_option('-q', '--quick', action='store_true', help='run a reduced parameter matrix')
+	parser.add_option('-r', '--repeat', type='int', default=5, help='repetitions per measurement (default: %default)')
+	parser.add_option('-c', '--compare', metavar='BASELINE', help='print time ratios relative to an earlier JSON result file')
+	opts, args = parser.parse_args()
+
+	results = run(QUICK_MATRIX if opts.quick else MATRIX, opts.repeat)
+	document = {
+		'meta': {
+			'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+			'python': platform.python_version(),
+			'numpy': numpy.__version__,
+			'platform': platform.platform(),
+			'machine': platform.machine(),
+		},
+		'results': results,
+	}
+	if opts.output:
+		with open(opts.output, 'w') as f:
+			json.dump(document, f, indent=1, sort_keys=True)
+	else:
+		json.dump(document, sys.stdout, indent=1, sort_keys=True)
+		sys.stdout.write('\n')
+	if opts.compare:
+		with open(opts.compare) as f:
+			compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,26 @@
+"""
+ClutterScope - Clutter-based software digitial storage oscilloscope
+Copyright (C) 2011  Leo Singer
+
+The data layer in clutterscope.data is imported here and needs only numpy,
+so that the buffers, decimation, triggering, and spectra can be used without
+a display. The user interface is in clutterscope.scope, which imports Clutter
+and Cogl; it is only imported by main(), or when it is imported explicitly.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+from clutterscope.data import (MAJOR_PIXELS, BACKGROUND_COLOR,
+	GRIDLINE_COLOR, TRACE_COLOR, LABEL_SIZE, LABEL_SPACING, graticule_lines,
+	finite_runs, polyline_coords, scale_for_level, samples_per_pixel,
+	ENVELOPE_CHUNK, MIN_BUCKET, minmax_envelope, trace_envelope, RingBuffer,
+	MappedChannel, SegmentedChannel, MinMaxPyramid, Decimator, Resampler, polyline_pixels,
+	SEGMENT_VERTEX, segment_vertices, Phosphor, Trigger, Welch,
+	log_spectrum_envelope, Measurements, MathChannel, FrameStats, frame_stats,
+	QualityGovernor, BlockQueue, Acquisition)
+
+
+def main():
+	"""Run the oscilloscope, importing the user interface first."""
+	from clutterscope import scope
+	scope.main()
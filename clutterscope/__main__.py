@@ -0,0 +1,5 @@
+"""Run the oscilloscope with python -m clutterscope."""
+from clutterscope import main
+
+
+main()
@@ -0,0 +1,1957 @@
+"""
+ClutterScope data layer: sample buffers, decimation, triggering, spectra, and
+frame statistics. This module depends only on numpy, so it can be imported
+without a display, for example by worker processes.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import ast
+import bisect
+import collections
+import math
+import mmap
+import re
+import threading
+import timeit
+import numpy
+
+
+# Layout shared by the Clutter actors and the software rasterizer
+
+"""Pixels between major gridlines"""
+MAJOR_PIXELS = 60
+
+"""Graticule background and gridline colors"""
+BACKGROUND_COLOR = '#282828'
+GRIDLINE_COLOR = '#3c3c3c'
+
+"""Default trace color"""
+TRACE_COLOR = 'cyan'
+
+"""Size of a trace label, and the space between labels"""
+LABEL_SIZE = (144, 48)
+LABEL_SPACING = 4
+
+
+def graticule_lines(w, h, major, detail=True):
+	"""Return the gridlines and ticks of a graticule of size w by h, centered
+	on (0, 0), with major gridlines every major pixels, as an array of rows
+	(x1, y1, x2, y2). Each major division has a long tick at its midpoint
+	and, if detail is true, short ticks at each tenth, along the axes."""
+	half_w = 0.5 * w
+	half_h = 0.5 * h
+	half_major = major // 2
+	tenth_major = major // 10
+	ticks = numpy.arange(tenth_major, major, tenth_major)
+	ticks = ticks[ticks != half_major]
+	if not detail:
+		ticks = ticks[:0]
+	lines = []
+
+	# Vertical gridlines.
+	x0 = int((-half_w // major) * major)
+	x = numpy.arange(x0, int(math.ceil(half_w)), major, dtype=float)
+	xx = (x[:, numpy.newaxis] + ticks).ravel()
+	lines += [
+		numpy.column_stack((x, numpy.full_like(x, -half_h), x, numpy.full_like(x, half_h))),
+		numpy.column_stack((x + half_major, numpy.full_like(x, -8), x + half_major, numpy.zeros_like(x))),
+		numpy.column_stack((xx, numpy.full_like(xx, -4), xx, numpy.zeros_like(xx)))]
+
+	# Horizontal gridlines.
+	y0 = int((-half_h // major) * major)
+	y = numpy.arange(y0, int(math.ceil(half_h)), major, dtype=float)
+	yy = (y[:, numpy.newaxis] + ticks).ravel()
+	lines += [
+		numpy.column_stack((numpy.full_like(y, -half_w), y, numpy.full_like(y, half_w), y)),
+		numpy.column_stack((numpy.zeros_like(y), y + half_major, numpy.full_like(y, 8), y + half_major)),
+		numpy.column_stack((numpy.zeros_like(yy), yy, numpy.full_like(yy, 4), yy))]
+
+	return numpy.concatenate(lines)
+
+
+def finite_runs(x, y):
+	"""Split the samples (x, y) into contiguous runs in which both x and y are
+	finite (neither NaN, nor infinity, nor minus infinity). Return a list of
+	(x, y) pairs of array views, one for each run.
+
+	>>> x = numpy.arange(8.)
+	>>> y = numpy.array([0., 1., numpy.nan, 3., 4., numpy.inf, 6., -numpy.inf])
+	>>> [xx.tolist() for xx, yy in finite_runs(x, y)]
+	[[0.0, 1.0], [3.0, 4.0], [6.0]]
+	"""
+	x = numpy.asarray(x)
+	y = numpy.asarray(y)
+	finite = numpy.zeros(len(x) + 2, dtype=numpy.int8)
+	finite[1:-1] = numpy.isfinite(x) & numpy.isfinite(y)
+	edges = numpy.flatnonzero(numpy.diff(finite))
+	return [(x[i:j], y[i:j]) for i, j in zip(edges[::2], edges[1::2])]
+
+
+def polyline_coords(x, y):
+	"""Return the interleaved coordinates x0, -y0, x1, -y1, ... of the points
+	(x, -y). The y axis is flipped so that positive values are drawn
+	upward."""
+	coords = numpy.empty(2 * len(x), dtype=numpy.float32)
+	coords[0::2] = x
+	coords[1::2] = y
+	coords[1::2] *= -1
+	return coords
+
+
+def scale_for_level(level):
+	"""Return the scale factor for a scale level. Whole scale levels step
+	through the sequence ..., 0.1, 0.2, 1, 2, 10, 20, 100, ...; fractional
+	levels fall geometrically between their neighbours."""
+	whole = int(math.floor(level))
+	a, b = divmod(whole, 2)
+	scale = 10 ** a
+	if b:
+		scale *= 2
+	frac = level - whole
+	if frac:
+		scale *= (5. if b else 2.) ** frac
+	return float(scale)
+
+
+def samples_per_pixel(level):
+	"""Return the number of samples that fall within each pixel column when a
+	trace with one sample per unit of x is drawn at the given scale level,
+	rounded down, or 1 if the samples are at least a pixel apart."""
+	scale = scale_for_level(level)
+	if scale >= 1:
+		return 1
+	# Allow for rounding error at the whole levels, where the result is exact.
+	return int(1. / scale * (1 + 1e-9))
+
+
+def _envelope(y, i0):
+	"""Compute the envelope of each row along the last two axes of y, in which
+	the first column has sample index i0. See minmax_envelope."""
+	nrows, ncols = y.shape[-2:]
+	finite = numpy.isfinite(y)
+	complete = finite.all(axis=-1)
+	if complete.all():
+		imin = y.argmin(axis=-1)
+		imax = y.argmax(axis=-1)
+	else:
+		imin = numpy.where(finite, y, numpy.inf).argmin(axis=-1)
+		imax = numpy.where(finite, y, -numpy.inf).argmax(axis=-1)
+	cols = numpy.empty(complete.shape + (4,), dtype=numpy.intp)
+	cols[..., 0] = 0
+	cols[..., 1] = numpy.minimum(imin, imax)
+	cols[..., 2] = numpy.maximum(imin, imax)
+	cols[..., 3] = ncols - 1
+	values = numpy.take_along_axis(y, cols, axis=-1).astype(numpy.float64)
+	# Lift the pen on either side of any bucket that contains a gap.
+	values[..., 0][~complete] = numpy.nan
+	values[..., 3][~complete] = numpy.nan
+	shape = y.shape[:-2] + (-1,)
+	rows = numpy.arange(nrows)[:, numpy.newaxis]
+	return (i0 + rows * ncols + cols).reshape(shape), values.reshape(shape)
+
+
+"""Number of samples that minmax_envelope reduces at a time, which bounds the
+size of its temporary arrays"""
+ENVELOPE_CHUNK = 1 << 20
+
+"""Smallest bucket that envelopes are decimated to. A bucket of fewer
+samples would be reduced to as many vertices as it has samples, so the
+samples are drawn as they are."""
+MIN_BUCKET = 4
+
+
+def minmax_envelope(y, i0, bucket):
+	"""Decimate the samples y, the first of which has sample index i0, into
+	buckets of the given number of samples. Each bucket is reduced to at most
+	four vertices: its first sample, its minimum and maximum in the order that
+	they occur, and its last sample, so that peaks and glitches stay visible
+	and consecutive buckets join up. Bucket boundaries fall on multiples of
+	the bucket size in sample index so that the envelope does not shimmer as
+	data scrolls by. Non-finite samples lift the pen on both sides of the
+	bucket that contains them. If the buckets are smaller than MIN_BUCKET,
+	the samples are returned as they are.
+
+	If y has more than one dimension, each row along the last axis is
+	decimated independently, as for many channels that share a time base.
+
+	Return a pair of arrays, the sample indices and values of the vertices,
+	with the same leading dimensions as y."""
+	y = numpy.asarray(y)
+	n = y.shape[-1]
+	if bucket < MIN_BUCKET or n == 0:
+		return numpy.broadcast_to(numpy.arange(i0, i0 + n), y.shape), y
+	lead = y.shape[:-1]
+	head = min(n, -i0 % bucket)
+	tail = head + (n - head) // bucket * bucket
+	parts = []
+	if head:
+		parts.append(_envelope(y[..., :head].reshape(lead + (1, -1)), i0))
+	chunk = max(1, ENVELOPE_CHUNK // (bucket * max(1, int(numpy.prod(lead))))) * bucket
+	for k in range(head, tail, chunk):
+		parts.append(_envelope(y[..., k:min(k + chunk, tail)].reshape(lead + (-1, bucket)), i0 + k))
+	if tail < n:
+		parts.append(_envelope(y[..., tail:].reshape(lead + (1, -1)), i0 + tail))
+	i, y = zip(*parts)
+	return numpy.concatenate(i, axis=-1), numpy.concatenate(y, axis=-1)
+
+
+def trace_envelope(buffer, pyramid, start, stop, bucket):
+	"""Return the sample indices and values of the vertices that represent the
+	samples in buffer with indices in the half-open range [start, stop),
+	decimated to buckets of the given number of samples. Read from pyramid if
+	there is one and the buckets are at least MIN_BUCKET samples, and
+	otherwise from the samples themselves. The pen is lifted
+	across gaps between the arrays of the buffer's window, as between the
+	segments of a SegmentedChannel."""
+	if bucket >= MIN_BUCKET and pyramid is not None and pyramid.depth:
+		return pyramid.envelope(start, stop, bucket)
+	parts = []
+	end = None
+	for i0, y in buffer.window(start, stop):
+		if end is not None and i0 != end:
+			lead = y.shape[:-1]
+			parts.append((numpy.full(lead + (1,), end), numpy.full(lead + (1,), numpy.nan)))
+		parts.append(minmax_envelope(y, i0, bucket))
+		end = i0 + y.shape[-1]
+	if not parts:
+		shape = (0,) if buffer.channels is None else (buffer.channels, 0)
+		return numpy.empty(shape, dtype=numpy.intp), numpy.empty(shape)
+	i, y = zip(*parts)
+	return numpy.concatenate(i, axis=-1), numpy.concatenate(y, axis=-1)
+
+
+class RingBuffer(object):
+	"""Fixed-capacity circular buffer of samples. Storage is allocated once up
+	front; appending never reallocates, and once the buffer is full each new
+	sample overwrites the oldest one. The sample with index i is always stored
+	at position i modulo the capacity.
+
+	If channels is given, the buffer holds that many channels that share a
+	time base, as the rows of a 2D array; blocks and the arrays returned by
+	reads then have a row per channel.
+
+	If storage is given, it is an existing array of the right shape and dtype
+	to keep the samples in, such as one in shared memory, and total and count
+	describe the samples that are already in it: the number appended over
+	its life, and the number that are valid."""
+
+	def __init__(self, capacity, dtype=numpy.float64, channels=None,
+			storage=None, total=0, count=0):
+		if capacity <= 0:
+			raise ValueError('capacity must be positive')
+		shape = (capacity,) if channels is None else (channels, capacity)
+		if storage is None:
+			self.__data = numpy.empty(shape, dtype=dtype)
+		elif storage.shape != shape or storage.dtype != numpy.dtype(dtype):
+			raise ValueError('storage must be an array of shape %r and dtype %s' % (shape, numpy.dtype(dtype)))
+		else:
+			self.__data = storage
+		if not 0 <= count <= min(total, capacity):
+			raise ValueError('count must be in the range [0, min(total, capacity)]')
+		self.channels = channels
+		self.__count = count
+		self.__total = total
+
+	def __len__(self):
+		return self.__count
+
+	@property
+	def total(self):
+		"""Number of samples appended over the life of the buffer, which is
+		also the index that the next appended sample will have."""
+		return self.__total
+
+	@property
+	def capacity(self):
+		return self.__data.shape[-1]
+
+	@property
+	def dtype(self):
+		return self.__data.dtype
+
+	def append(self, block):
+		"""Append a block of samples, overwriting the oldest samples if the
+		buffer would overflow."""
+		if self.channels is None:
+			block = numpy.ravel(block)
+		else:
+			block = numpy.asarray(block).reshape(self.channels, -1)
+		n = block.shape[-1]
+		capacity = self.__data.shape[-1]
+		if n > capacity:
+			block = block[..., -capacity:]
+		m = block.shape[-1]
+		head = (self.__total + n - m) % capacity
+		m1 = min(m, capacity - head)
+		self.__data[..., head:head + m1] = block[..., :m1]
+		self.__data[..., :m - m1] = block[..., m1:]
+		self.__count = min(self.__count + n, capacity)
+		self.__total += n
+
+	def clear(self):
+		"""Discard all samples."""
+		self.__count = 0
+
+	def advance(self, n, value=numpy.nan):
+		"""Append n samples of the given value, writing no more than the
+		capacity of the buffer, as for a gap of any length."""
+		m = min(n, self.capacity)
+		shape = (m,) if self.channels is None else (self.channels, m)
+		self.append(numpy.full(shape, value, dtype=self.dtype))
+		self.__total += n - m
+
+	def fill_channel(self, channel, value=numpy.nan):
+		"""Overwrite all of the samples of one channel with a value."""
+		self.__data[channel] = value
+
+	def remove_channel(self, channel):
+		"""Move the samples of the channels after the given one up by a row,
+		dropping the given one. The last row is filled with NaN."""
+		self.__data[channel:-1] = self.__data[channel + 1:]
+		self.__data[-1] = numpy.nan
+
+	def regions(self):
+		"""Return a tuple of one or two arrays that are views of the valid
+		samples, from oldest to newest, without copying. There are two arrays
+		if the valid samples wrap around the end of the storage."""
+		data = self.__data
+		head = self.__total % data.shape[-1]
+		start = head - self.__count
+		if start >= 0:
+			return (data[..., start:head],)
+		else:
+			return (data[..., start:], data[..., :head])
+
+	def window(self, start, stop):
+		"""Return a list of (index, array) pairs covering the valid samples
+		whose indices lie in the half-open range [start, stop), without
+		copying. Each index is that of the first sample in its array."""
+		result = []
+		i0 = self.__total - self.__count
+		for region in self.regions():
+			i1 = i0 + region.shape[-1]
+			lo = max(start, i0)
+			hi = min(stop, i1)
+			if lo < hi:
+				result.append((lo, region[..., lo - i0:hi - i0]))
+			i0 = i1
+		return result
+
+	def take(self, indices):
+		"""Return a copy of the samples with the given indices, which must be
+		valid."""
+		return self.__data[..., numpy.asarray(indices) % self.__data.shape[-1]]
+
+	def to_array(self):
+		"""Return a contiguous copy of the valid samples, oldest first."""
+		return numpy.concatenate(self.regions(), axis=-1)
+
+
+class MappedChannel(object):
+	"""Read-only channel of recorded samples in a memory-mapped file. It
+	provides the same interface for reading as a RingBuffer, so it can stand in
+	for the buffer of a Trace. Opening a file only maps it; pages are read
+	from disk when the samples on them are first drawn.
+
+	Files ending in .npy are opened with numpy.load; if the array has two
+	dimensions, its columns are channels. Other files are raw binary with
+	samples of the given dtype, optionally preceded by a header of offset
+	bytes, and with the samples of the given number of channels interleaved."""
+
+	"""Fraction of the visible window to read ahead on either side"""
+	READ_AHEAD = 0.25
+
+	"""Samples are one-dimensional, as in a RingBuffer without channels"""
+	channels = None
+
+	def __init__(self, filename, dtype=numpy.float64, sample_rate=1., channels=1, channel=0, offset=0):
+		if filename.endswith('.npy'):
+			mapped = data = numpy.load(filename, mmap_mode='r')
+			if data.ndim > 2:
+				raise ValueError('expected a 1D or 2D array in %s' % filename)
+			columns = data.shape[1] if data.ndim == 2 else 1
+			if not 0 <= channel < columns:
+				raise ValueError('channel must be in the range [0, %d) for %s' % (columns, filename))
+			if data.ndim == 2:
+				data = data[:, channel]
+		else:
+			if not 0 <= channel < channels:
+				raise ValueError('channel must be in the range [0, channels)')
+			mapped = numpy.memmap(filename, dtype=dtype, mode='r', offset=offset)
+			n = len(mapped) // channels
+			data = mapped[:n * channels].reshape(n, channels)[:, channel]
+		self.__data = data
+		self.filename = filename
+		self.sample_rate = sample_rate
+
+		# Where the operating system can be advised to read pages ahead, map
+		# the file again to do so, and note where the first sample is in it.
+		self.__map = None
+		if hasattr(mmap, 'MADV_WILLNEED') and len(data):
+			with open(filename, 'rb') as f:
+				self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			self.__offset = mapped.offset + (
+				data.__array_interface__['data'][0] - mapped.__array_interface__['data'][0])
+		self.__ahead = None
+		self.__thread = None
+
+	def __len__(self):
+		return len(self.__data)
+
+	@property
+	def total(self):
+		return len(self.__data)
+
+	@property
+	def capacity(self):
+		return len(self.__data)
+
+	@property
+	def dtype(self):
+		return self.__data.dtype
+
+	def regions(self):
+		return (self.__data,)
+
+	def window(self, start, stop):
+		start = max(start, 0)
+		stop = min(stop, len(self.__data))
+		if start < stop:
+			return [(start, self.__data[start:stop])]
+		else:
+			return []
+
+	def take(self, indices):
+		return self.__data[numpy.asarray(indices)]
+
+	def prefetch(self, start, stop):
+		"""Read the pages that hold the samples with indices in the
+		half-open range [start, stop) from disk. If the operating system
+		supports madvise(MADV_WILLNEED), it is only advised to, and this
+		returns at once; otherwise, the pages are faulted in by reading one
+		sample per page, which waits for the disk."""
+		start = max(start, 0)
+		stop = min(stop, len(self.__data))
+		if start >= stop:
+			return
+		stride = self.__data.strides[0]
+		if self.__map is not None:
+			begin = self.__offset + start * stride
+			end = self.__offset + (stop - 1) * stride + self.__data.itemsize
+			begin -= begin % mmap.PAGESIZE
+			self.__map.madvise(mmap.MADV_WILLNEED, begin, end - begin)
+		else:
+			step = max(1, mmap.PAGESIZE // stride)
+			numpy.sum(self.__data[start:stop:step])
+
+	def read_ahead(self, start, stop):
+		"""Prefetch a margin of READ_AHEAD times the width of the visible
+		window [start, stop) on either side, so that panning does not wait
+		for the disk. This does nothing unless the window has moved, and
+		never waits for the disk itself: without madvise, the pages are
+		faulted in by a background thread, and a move while it is still at
+		work is caught up with on a later call."""
+		if (start, stop) == self.__ahead:
+			return
+		if self.__thread is not None and self.__thread.is_alive():
+			return
+		self.__ahead = (start, stop)
+		margin = int((stop - start) * self.READ_AHEAD)
+		ranges = ((start - margin, start), (stop, stop + margin))
+		if self.__map is not None:
+			for lo, hi in ranges:
+				self.prefetch(lo, hi)
+		else:
+			self.__thread = threading.Thread(target=self.__prefetch, args=(ranges,))
+			self.__thread.daemon = True
+			self.__thread.start()
+
+	def __prefetch(self, ranges):
+		for start, stop in ranges:
+			self.prefetch(start, stop)
+
+
+class SegmentedChannel(object):
+	"""Uniformly sampled channel stored as contiguous segments, each of which
+	keeps only the index of its first sample and an array of samples. The
+	time of the sample with index i is epoch + i / sample_rate, so neither
+	time stamps nor sample indices are stored, and a gap in the data is the
+	space between two segments rather than samples filled with NaN. Finding
+	the segment that holds an index, or the gaps in a range, is a binary
+	search over the segments.
+
+	It provides the same interface for reading as a RingBuffer, so it can
+	stand in for the buffer of a Trace; as for a MappedChannel, the capacity
+	is the span of the samples, so that they fill the trace. If max_samples
+	is given, the oldest samples are discarded to keep at most that many."""
+
+	"""Samples are one-dimensional, as in a RingBuffer without channels"""
+	channels = None
+
+	def __init__(self, sample_rate=1., epoch=0., dtype=numpy.float64, max_samples=None):
+		if sample_rate <= 0:
+			raise ValueError('sample_rate must be positive')
+		self.sample_rate = float(sample_rate)
+		self.epoch = epoch
+		self.max_samples = max_samples
+		self.__dtype = numpy.dtype(dtype)
+		# Index of the first sample, storage (which may have room to grow at
+		# the end), and number of samples of each segment
+		self.__starts = []
+		self.__data = []
+		self.__counts = []
+		self.__size = 0
+
+	def __len__(self):
+		if not self.__starts:
+			return 0
+		return self.total - self.__starts[0]
+
+	@property
+	def total(self):
+		"""Index after that of the newest sample, which is also the index
+		that the next sample will have if it continues the last segment."""
+		if not self.__starts:
+			return 0
+		return self.__starts[-1] + self.__counts[-1]
+
+	@property
+	def capacity(self):
+		return len(self)
+
+	@property
+	def dtype(self):
+		return self.__dtype
+
+	@property
+	def size(self):
+		"""Number of samples stored, not counting gaps."""
+		return self.__size
+
+	def index(self, time):
+		"""Return the index of the sample nearest to a time."""
+		return int(round((time - self.epoch) * self.sample_rate))
+
+	def times(self, indices):
+		"""Return the times of the samples with the given indices."""
+		return self.epoch + numpy.asarray(indices) / self.sample_rate
+
+	def append(self, block, start_time=None):
+		"""Append a block of samples, the first of which was taken at
+		start_time. The block continues the last segment if start_time is
+		omitted or is within half a sample of the end of the last segment,
+		and otherwise starts a new segment after a gap. Samples may not go
+		back in time."""
+		block = numpy.ravel(block)
+		n = len(block)
+		if n == 0:
+			return
+		total = self.total
+		i0 = total if start_time is None else self.index(start_time)
+		if self.__starts and i0 < total:
+			raise ValueError('block starts at index %d, before the end of the last segment at %d' % (i0, total))
+		if self.__starts and i0 == total:
+			data = self.__data[-1]
+			count = self.__counts[-1]
+			if count + n > len(data):
+				grown = numpy.empty(2 * (count + n), dtype=self.__dtype)
+				grown[:count] = data[:count]
+				self.__data[-1] = data = grown
+			data[count:count + n] = block
+			self.__counts[-1] += n
+		else:
+			self.__starts.append(i0)
+			self.__data.append(block.astype(self.__dtype))
+			self.__counts.append(n)
+		self.__size += n
+		if self.max_samples is not None and self.__size > self.max_samples:
+			self.__discard(self.__size - self.max_samples)
+
+	def __discard(self, n):
+		"""Discard the oldest n samples."""
+		while n >= self.__counts[0]:
+			n -= self.__counts[0]
+			self.__size -= self.__counts[0]
+			del self.__starts[0], self.__data[0], self.__counts[0]
+		if n:
+			self.__starts[0] += n
+			self.__data[0] = self.__data[0][n:]
+			self.__counts[0] -= n
+			self.__size -= n
+
+	def clear(self):
+		"""Discard all samples."""
+		self.__starts = []
+		self.__data = []
+		self.__counts = []
+		self.__size = 0
+
+	def __segment(self, i):
+		"""Return the position of the last segment that starts at or before
+		index i, or -1 if there is none."""
+		return bisect.bisect_right(self.__starts, i) - 1
+
+	def segments(self):
+		"""Return a list of (index, array) pairs, one for each segment, with
+		the index of its first sample and a view of its samples."""
+		return [(i0, data[:count]) for i0, data, count in zip(self.__starts, self.__data, self.__counts)]
+
+	def gaps(self, start, stop):
+		"""Return a list of the half-open ranges of indices, clipped to
+		[start, stop), that fall between segments."""
+		result = []
+		for k in range(max(1, self.__segment(start) + 1), len(self.__starts)):
+			lo = self.__starts[k - 1] + self.__counts[k - 1]
+			if lo >= stop:
+				break
+			result.append((max(lo, start), min(self.__starts[k], stop)))
+		return result
+
+	def regions(self):
+		return tuple(data[:count] for data, count in zip(self.__data, self.__counts))
+
+	def window(self, start, stop):
+		result = []
+		for k in range(max(0, self.__segment(start)), len(self.__starts)):
+			i0 = self.__starts[k]
+			if i0 >= stop:
+				break
+			lo = max(start, i0)
+			hi = min(stop, i0 + self.__counts[k])
+			if lo < hi:
+				result.append((lo, self.__data[k][lo - i0:hi - i0]))
+		return result
+
+	def take(self, indices):
+		"""Return the samples with the given indices, with NaN for indices
+		that fall in gaps."""
+		indices = numpy.asarray(indices)
+		result = numpy.full(indices.shape, numpy.nan, dtype=numpy.result_type(self.__dtype, float))
+		if self.__starts:
+			k = numpy.searchsorted(self.__starts, indices, side='right') - 1
+			for j in numpy.unique(k[k >= 0]):
+				offset = indices - self.__starts[j]
+				mask = (k == j) & (offset < self.__counts[j])
+				result[mask] = self.__data[j][offset[mask]]
+		return result
+
+
+def _ring_read(a, start, stop):
+	"""Return the elements of the ring array a with indices in the half-open
+	range [start, stop), modulo its length, along its last axis."""
+	n = a.shape[-1]
+	i = start % n
+	j = i + stop - start
+	if j <= n:
+		return a[..., i:j]
+	return numpy.concatenate((a[..., i:], a[..., :j - n]), axis=-1)
+
+
+def _ring_write(a, start, values):
+	"""Write values to the ring array a from index start, modulo its length,
+	along its last axis."""
+	n = a.shape[-1]
+	i = start % n
+	j = i + values.shape[-1]
+	if j <= n:
+		a[..., i:j] = values
+	else:
+		a[..., i:] = values[..., :n - i]
+		a[..., :j - n] = values[..., n - i:]
+
+
+class MinMaxPyramid(object):
+	"""Multi-resolution summary of the samples in a RingBuffer. Level k of the
+	pyramid divides the samples into nodes of 2 ** k samples, and records for
+	each node the minimum and maximum of its finite samples (+inf and -inf if
+	there are none) and whether all of its samples are finite. Each level is a
+	ring of nodes, so the pyramid takes about twice the memory of the buffer,
+	and appending only touches the nodes at the tail of each level. If the
+	buffer has several channels, each level has a row per channel."""
+
+	def __init__(self, buffer):
+		self.buffer = buffer
+		self.__levels = []
+		lead = () if buffer.channels is None else (buffer.channels,)
+		k = 1
+		while 2 ** k <= buffer.capacity:
+			n = (buffer.capacity >> k) + 4
+			self.__levels.append((
+				numpy.empty(lead + (n,), dtype=buffer.dtype),
+				numpy.empty(lead + (n,), dtype=buffer.dtype),
+				numpy.empty(lead + (n,), dtype=bool)))
+			k += 1
+
+	@property
+	def depth(self):
+		"""Number of levels above the samples themselves."""
+		return len(self.__levels)
+
+	def update(self, start, stop):
+		"""Recompute the nodes that cover the samples with indices in the
+		half-open range [start, stop). Call after appending to the buffer."""
+		first = self.buffer.total - len(self.buffer)
+		self.__update(max(start, first), stop)
+		# The oldest node of each level may also cover samples that have
+		# been overwritten since it was computed; recompute it without them.
+		if 0 < first < start:
+			self.__evict(first)
+
+	def __evict(self, first):
+		"""Recompute the node that holds the oldest sample, first, on each
+		level where it is not the first sample of that node."""
+		last = self.buffer.total - 1
+		# Nodes that begin at first hold no overwritten samples, and neither
+		# do their children.
+		k0 = (first & -first).bit_length()
+		for k in range(k0, self.depth + 1):
+			j = first >> k
+			lo = max(2 * j, first >> (k - 1))
+			hi = min(2 * j + 2, (last >> (k - 1)) + 1)
+			if k == 1:
+				y = self.__samples(lo, hi)
+				completes = numpy.isfinite(y)
+				mins = numpy.where(completes, y, numpy.inf)
+				maxs = numpy.where(completes, y, -numpy.inf)
+			else:
+				mins, maxs, completes = (_ring_read(a, lo, hi) for a in self.__levels[k - 2])
+			level = self.__levels[k - 1]
+			i = j % level[0].shape[-1]
+			if hi - lo == 2:
+				level[0][..., i] = numpy.minimum(mins[..., 0], mins[..., 1])
+				level[1][..., i] = numpy.maximum(maxs[..., 0], maxs[..., 1])
+				level[2][..., i] = completes[..., 0] & completes[..., 1]
+			else:
+				level[0][..., i] = mins[..., 0]
+				level[1][..., i] = maxs[..., 0]
+				level[2][..., i] = completes[..., 0]
+
+	def __update(self, start, stop):
+		total = self.buffer.total
+		first = total - len(self.buffer)
+		if start >= stop:
+			return
+		below = None
+		for k, level in enumerate(self.__levels, 1):
+			# Nodes [start, stop) of this level have children [c0, c1) on the
+			# level below, of which [r0, r1) hold samples; only the child at
+			# either edge may not.
+			start >>= 1
+			stop = ((stop - 1) >> 1) + 1
+			c0, c1 = 2 * start, 2 * stop
+			if below is None:
+				r0, r1 = max(c0, first), min(c1, total)
+				y = self.__samples(r0, r1)
+				completes = numpy.isfinite(y)
+				mins = numpy.where(completes, y, numpy.inf)
+				maxs = numpy.where(completes, y, -numpy.inf)
+			else:
+				r0 = max(c0, first >> (k - 1))
+				r1 = min(c1, ((total - 1) >> (k - 1)) + 1)
+				mins, maxs, completes = (_ring_read(a, r0, r1) for a in below)
+			# A node with only one child takes its values; the others reduce
+			# their pairs of children.
+			lo = r0 - c0
+			hi = r1 - r0 - (c1 - r1)
+			if lo:
+				for a, b in zip(level, (mins, maxs, completes)):
+					a[..., start % a.shape[-1]] = b[..., 0]
+			if hi < r1 - r0:
+				for a, b in zip(level, (mins, maxs, completes)):
+					a[..., (stop - 1) % a.shape[-1]] = b[..., -1]
+			if lo < hi:
+				_ring_write(level[0], start + lo, numpy.minimum(mins[..., lo:hi:2], mins[..., lo + 1:hi:2]))
+				_ring_write(level[1], start + lo, numpy.maximum(maxs[..., lo:hi:2], maxs[..., lo + 1:hi:2]))
+				_ring_write(level[2], start + lo, completes[..., lo:hi:2] & completes[..., lo + 1:hi:2])
+			below = level
+
+	def __samples(self, start, stop):
+		"""Return the samples with indices in the half-open range [start,
+		stop), with NaN for any that the buffer does not have."""
+		window = self.buffer.window(start, stop)
+		if len(window) == 1 and window[0][0] == start and window[0][1].shape[-1] == stop - start:
+			return window[0][1]
+		lead = () if self.buffer.channels is None else (self.buffer.channels,)
+		y = numpy.full(lead + (stop - start,), numpy.nan)
+		for i0, part in window:
+			y[..., i0 - start:i0 - start + part.shape[-1]] = part
+		return y
+
+	def clear_channel(self, channel):
+		"""Mark all of the nodes of one channel as empty, as after
+		RingBuffer.fill_channel with NaN."""
+		for mins, maxs, completes in self.__levels:
+			mins[channel] = numpy.inf
+			maxs[channel] = -numpy.inf
+			completes[channel] = False
+
+	def remove_channel(self, channel):
+		"""Move the nodes of the channels after the given one up by a row, as
+		RingBuffer.remove_channel does with the samples."""
+		for level in self.__levels:
+			for a in level:
+				a[channel:-1] = a[channel + 1:]
+		self.clear_channel(-1)
+
+	def level(self, bucket):
+		"""Return the coarsest level whose nodes are no wider than bucket
+		samples."""
+		return min(int(bucket).bit_length() - 1, self.depth)
+
+	def envelope(self, start, stop, bucket, channels=None):
+		"""Return the envelope of the samples with indices in the half-open
+		range [start, stop), read from the coarsest level whose nodes are no
+		wider than bucket samples. Each node contributes a vertex at its
+		minimum and one at its maximum, both placed at its center. The pen is
+		lifted on either side of nodes that contain non-finite samples.
+
+		If the buffer has several channels, channels selects the rows to read
+		(by default, all of them). The vertices of all of the channels then
+		share their sample indices, and a channel that has no gap where
+		another one does repeats its maximum instead of lifting the pen.
+
+		Return a pair of arrays, the sample indices (which are fractional) and
+		values of the vertices."""
+		total = self.buffer.total
+		start = max(start, total - len(self.buffer))
+		stop = min(stop, total)
+		k = self.level(bucket)
+		if k < 1 or start >= stop:
+			raise ValueError('no pyramid level for this range and bucket')
+		mins, maxs, completes = self.__levels[k - 1]
+		if channels is not None:
+			mins, maxs, completes = mins[channels], maxs[channels], completes[channels]
+		j = numpy.arange(start >> k, ((stop - 1) >> k) + 1)
+		idx = j % mins.shape[-1]
+		complete = completes[..., idx]
+		gap = ~complete
+		gap[..., :-1] |= ~complete[..., 1:]
+
+		y = numpy.empty(gap.shape + (3,), dtype=mins.dtype)
+		y[..., 0] = mins[..., idx]
+		y[..., 1] = maxs[..., idx]
+		y[~numpy.isfinite(y)] = numpy.nan
+		y[..., 2] = numpy.where(gap, numpy.nan, y[..., 1])
+		x = numpy.empty((len(j), 3))
+		x[:] = ((j << k) + 0.5 * ((1 << k) - 1))[:, numpy.newaxis]
+
+		# Keep the separator only after nodes that border a gap.
+		keep = numpy.ones((len(j), 3), dtype=bool)
+		keep[:, 2] = gap.reshape(-1, len(j)).any(axis=0)
+		return x[keep], y[..., keep]
+
+
+class Decimator(object):
+	"""Streaming FIR decimator. The input is low-pass filtered with a
+	windowed-sinc filter of about taps_per_phase * factor taps and only every
+	factor'th output is computed, which is equivalent to running the factor
+	polyphase components of the filter at the output rate. Output m is
+	centered on input sample m * factor, so the output does not lag the
+	input. The samples needed by the next output are carried over from one
+	block to the next, so a stream gives the same output however it is
+	split into blocks. Outputs whose support includes non-finite samples
+	are NaN."""
+
+	def __init__(self, factor, taps_per_phase=8):
+		if factor < 1:
+			raise ValueError('factor must be at least 1')
+		self.factor = factor
+		self.delay = taps_per_phase * factor // 2
+		n = numpy.arange(2 * self.delay + 1) - self.delay
+		taps = numpy.sinc(n / float(factor)) * numpy.blackman(len(n))
+		self.taps = taps / taps.sum()
+		self.reset()
+
+	def reset(self):
+		"""Forget the samples carried over from earlier blocks."""
+		self.__pending = numpy.empty(0)
+		self.__pending_start = None
+		self.__next = None
+
+	def process(self, block, i0):
+		"""Filter a block of samples, the first of which has index i0.
+		Return a pair of arrays, the indices and values of the outputs that
+		are now complete. If the block does not follow on from the last
+		one, the decimator starts over."""
+		block = numpy.asarray(block, dtype=numpy.float64)
+		q = self.factor
+		if self.__pending_start is None or i0 != self.__pending_start + len(self.__pending):
+			self.__pending = block
+			self.__pending_start = i0
+			self.__next = -(-(i0 + self.delay) // q)
+		else:
+			self.__pending = numpy.concatenate((self.__pending, block))
+		stop = self.__pending_start + len(self.__pending)
+		last = (stop - 1 - self.delay) // q
+		m = numpy.arange(self.__next, last + 1)
+		if not len(m):
+			return m, numpy.empty(0)
+		pending = self.__pending
+		offset = q * self.__next - self.delay - self.__pending_start
+		windows = numpy.lib.stride_tricks.as_strided(pending[offset:],
+			shape=(len(m), len(self.taps)),
+			strides=(q * pending.strides[0], pending.strides[0]))
+		y = windows.dot(self.taps)
+		# Keep the samples that the next output needs.
+		self.__next = last + 1
+		keep = q * self.__next - self.delay - self.__pending_start
+		self.__pending = pending[keep:].copy()
+		self.__pending_start += keep
+		return m, y
+
+
+class Resampler(object):
+	"""Band-limited, decimated views of the samples in a buffer, as an
+	alternative to min/max envelopes. Decimation by 2 ** k is a cascade of k
+	Decimator stages that each halve the rate, and the output of each stage
+	is cached in a RingBuffer. Stages are brought up to date only when a view
+	that needs them is requested, and then only filter the samples that have
+	arrived since, so zooming back and forth does not filter anything
+	twice. A view only filters the samples near its own range, and no stage
+	holds more than MAX_STAGE_SAMPLES outputs, so a Resampler over a long
+	recording, such as a MappedChannel, does not grow with it."""
+
+	"""Largest number of outputs cached by a stage, and of input samples
+	passed down the cascade at once"""
+	MAX_STAGE_SAMPLES = 1 << 18
+
+	def __init__(self, buffer, taps_per_phase=8):
+		self.buffer = buffer
+		self.taps_per_phase = taps_per_phase
+		self.__stages = []
+
+	def reset(self):
+		"""Discard all cached outputs."""
+		self.__stages = []
+
+	def __stage(self, k):
+		"""Return stage k (k >= 1) as a list [decimator, outputs, first,
+		processed, begun]: outputs holds output m at position m - first,
+		processed is the index of the next input sample to filter, and begun
+		is the index of the first sample of the buffer that was needed when
+		the stage last started over."""
+		while len(self.__stages) < k:
+			capacity = max(1, self.buffer.capacity >> (len(self.__stages) + 1))
+			capacity = min(capacity, self.MAX_STAGE_SAMPLES) + 4
+			self.__stages.append([Decimator(2, self.taps_per_phase),
+				RingBuffer(capacity), None, None, None])
+		return self.__stages[k - 1]
+
+	def __window(self, k, start, stop):
+		"""Window of the samples of stage k (stage 0 is the buffer)."""
+		if k == 0:
+			return self.buffer.window(start, stop)
+		decimator, outputs, first, processed, begun = self.__stage(k)
+		if first is None:
+			return []
+		return [(i0 + first, y) for i0, y in outputs.window(start - first, stop - first)]
+
+	def __bounds(self, k):
+		"""Half-open range of indices of the samples held by stage k."""
+		if k == 0:
+			return self.buffer.total - len(self.buffer), self.buffer.total
+		decimator, outputs, first, processed, begun = self.__stage(k)
+		if first is None:
+			return 0, 0
+		return first + outputs.total - len(outputs), first + outputs.total
+
+	def update(self, k, start=None, stop=None):
+		"""Bring stages 1 through k up to date; if the half-open range [start,
+		stop) of sample indices is given, only as far as the outputs of stage
+		k in that range need. The input is passed down the cascade in blocks
+		of at most MAX_STAGE_SAMPLES samples."""
+		lo, hi = self.__bounds(0)
+		if start is not None:
+			margin = (self.taps_per_phase + 1) << k
+			lo = max(lo, start - margin)
+			hi = max(lo, min(hi, stop + margin))
+		# A stage starts over if it has filtered none of the range, or only a
+		# later part of it. Going back from stage k, which has to cover the
+		# range itself, a stage also has to start over if the stage after it
+		# does and needs outputs that it has dropped.
+		need = (lo if start is None else start) >> k
+		over = True
+		for j in range(k, 0, -1):
+			stage = self.__stage(j)
+			outputs = stage[1]
+			if over and len(outputs) == outputs.capacity and self.__bounds(j)[0] > need:
+				stage[3] = None
+			need = lo >> (j - 1)
+			over = stage[3] is None or lo < stage[4] or \
+				stage[3] < max(self.__bounds(j - 1)[0], need)
+		limit = lo
+		while True:
+			limit = min(hi, limit + self.MAX_STAGE_SAMPLES)
+			self.__update(k, lo, limit)
+			if limit >= hi:
+				break
+
+	def __update(self, k, lo, limit):
+		"""Filter the input samples of stage 1 from lo up to limit, and pass
+		the outputs on through stages 2 through k."""
+		over = False
+		for j in range(1, k + 1):
+			stage = self.__stage(j)
+			decimator, outputs, first, processed, begun = stage
+			start, stop = self.__bounds(j - 1)
+			start = max(start, lo >> (j - 1))
+			if j == 1:
+				stop = min(stop, limit)
+			if over or processed is None or processed < start or lo < begun:
+				# Start over if the samples that were due next are gone, or
+				# if the range needs samples from before those filtered so
+				# far, and then start the stages after this one over too.
+				over = True
+				decimator.reset()
+				outputs.clear()
+				stage[2] = None
+				stage[4] = lo
+				processed = start
+			for i0, y in self.__window(j - 1, processed, stop):
+				m, out = decimator.process(y, i0)
+				if len(m):
+					if stage[2] is None or m[0] != stage[2] + outputs.total:
+						outputs.clear()
+						stage[2] = m[0] - outputs.total
+					outputs.append(out)
+			stage[3] = max(processed, stop)
+
+	def envelope(self, start, stop, bucket):
+		"""Return the sample indices and values of the filtered samples with
+		indices in the half-open range [start, stop), decimated by the
+		largest power of two that is no more than bucket."""
+		k = int(bucket).bit_length() - 1
+		self.update(k, start, stop)
+		parts = [(numpy.arange(i0, i0 + len(y)) << k, y)
+			for i0, y in self.__window(k, start >> k, ((stop - 1) >> k) + 1)]
+		if not parts:
+			return numpy.empty(0, dtype=numpy.intp), numpy.empty(0)
+		i, y = zip(*parts)
+		return numpy.concatenate(i), numpy.concatenate(y)
+
+
+def polyline_pixels(x, y, width, height):
+	"""Return the flat indices (row * width + column) of the pixels that the
+	segments of the polyline through (x, y) pass through on a width by height
+	grid, in pixel coordinates. Segments with a non-finite end are skipped, so
+	NaNs lift the pen as usual. Each segment is sampled once per pixel along
+	its longer axis, excluding its final point, so that a pixel shared by two
+	consecutive segments is only counted once."""
+	x = numpy.asarray(x, dtype=float)
+	y = numpy.asarray(y, dtype=float)
+	x0 = x[:-1]
+	y0 = y[:-1]
+	dx = numpy.diff(x)
+	dy = numpy.diff(y)
+	ok = numpy.isfinite(x0) & numpy.isfinite(y0) & numpy.isfinite(dx) & numpy.isfinite(dy)
+	x0, y0, dx, dy = x0[ok], y0[ok], dx[ok], dy[ok]
+	# Clip the number of steps so that a wild segment cannot blow up memory.
+	steps = numpy.ceil(numpy.maximum(abs(dx), abs(dy)))
+	steps = numpy.clip(steps, 1, width + height).astype(numpy.intp)
+	segment = numpy.repeat(numpy.arange(len(steps)), steps)
+	first = numpy.cumsum(steps) - steps
+	t = (numpy.arange(len(segment)) - first[segment]) / steps[segment].astype(float)
+	col = numpy.floor(x0[segment] + t * dx[segment]).astype(numpy.intp)
+	row = numpy.floor(y0[segment] + t * dy[segment]).astype(numpy.intp)
+	inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+	return row[inside] * width + col[inside]
+
+
+"""Layout of a vertex of a batch of colored line segments"""
+SEGMENT_VERTEX = numpy.dtype([('position', numpy.float32, 2), ('color', numpy.uint8, 4)])
+
+
+def segment_vertices(x, y, colors, out=None):
+	"""Return the vertices of the line segments of many polylines at once, as
+	an array of SEGMENT_VERTEX with two vertices per segment, for drawing as
+	lines in a single batch. Each row of the 2D arrays x and y is a polyline,
+	drawn in the RGBA color in the corresponding row of colors. Segments with
+	a non-finite end are skipped, so NaNs lift the pen as usual.
+
+	The vertices are written to the start of out, which is replaced with a
+	larger array if it is None or too small, and returned as a view of out;
+	pass the base of the view on the next call to reuse the storage."""
+	x, y = numpy.broadcast_arrays(x, y)
+	ok = numpy.isfinite(x) & numpy.isfinite(y)
+	ok = ok[:, :-1] & ok[:, 1:]
+	rows, cols = numpy.nonzero(ok)
+	n = 2 * len(rows)
+	if out is None or len(out) < n:
+		out = numpy.empty(1 << int(max(n, 1) - 1).bit_length(), dtype=SEGMENT_VERTEX)
+	vertices = out[:n]
+	position = vertices['position']
+	position[0::2, 0] = x[rows, cols]
+	position[0::2, 1] = y[rows, cols]
+	position[1::2, 0] = x[rows, cols + 1]
+	position[1::2, 1] = y[rows, cols + 1]
+	vertices['color'][0::2] = colors[rows]
+	vertices['color'][1::2] = colors[rows]
+	return vertices
+
+
+class Phosphor(object):
+	"""Decaying 2D histogram of how often waveforms have passed through each
+	pixel, like the phosphor of an analog or digital persistence scope. Its
+	memory depends only on its size, not on how many waveforms have been
+	accumulated. Waveforms that are added between flushes are only traced
+	into lists of pixels; each flush makes a single pass over the
+	histogram, however many waveforms it applies."""
+
+	def __init__(self, width, height, decay=0.9):
+		self.width = width
+		self.height = height
+		self.decay = decay
+		self.hits = numpy.zeros((height, width), dtype=numpy.float32)
+		self.__queued = []
+		self.__queued_pixels = 0
+
+	def clear(self):
+		self.hits[:] = 0
+		self.__queued = []
+		self.__queued_pixels = 0
+
+	def add(self, x, y):
+		"""Queue a waveform, given as a polyline in pixel coordinates, for the
+		next flush. The queue is flushed by itself once it holds as many
+		pixels as the histogram."""
+		idx = polyline_pixels(x, y, self.width, self.height)
+		self.__queued.append(idx)
+		self.__queued_pixels += len(idx)
+		if self.__queued_pixels >= self.hits.size:
+			self.flush()
+
+	def flush(self):
+		"""Accumulate the queued waveforms, as if each one in turn faded the
+		existing hits by decay and was then added: the hits are faded by
+		decay to the power of the number of waveforms, and each waveform is
+		added with the weight that the ones after it leave it."""
+		k = len(self.__queued)
+		if not k:
+			return
+		counts = [len(idx) for idx in self.__queued]
+		weights = numpy.repeat(self.decay ** numpy.arange(k - 1, -1, -1, dtype=float), counts)
+		idx = numpy.concatenate(self.__queued)
+		self.__queued = []
+		self.__queued_pixels = 0
+		self.hits *= self.decay ** k
+		self.hits += numpy.bincount(idx, weights, minlength=self.hits.size).reshape(self.hits.shape)
+
+	def accumulate(self, x, y):
+		"""Fade the existing hits by decay and add a waveform, given as a
+		polyline in pixel coordinates."""
+		self.add(x, y)
+		self.flush()
+
+	def image(self, red, green, blue):
+		"""Return a height by width by 4 array of premultiplied RGBA bytes.
+		Density is mapped logarithmically to brightness, from transparent,
+		through the given color, to white where it is highest. Queued
+		waveforms are flushed first."""
+		self.flush()
+		peak = self.hits.max()
+		if peak <= 0:
+			return numpy.zeros((self.height, self.width, 4), dtype=numpy.uint8)
+		t = numpy.log1p(self.hits) / numpy.log1p(peak)
+		t3 = t ** 3
+		rgba = numpy.empty((self.height, self.width, 4), dtype=numpy.uint8)
+		for channel, value in enumerate((red, green, blue)):
+			rgba[..., channel] = value * t + (255 - value) * t3
+		rgba[..., 3] = 255 * t
+		return rgba
+
+
+class Trigger(object):
+	"""Finds trigger events in a stream of sample blocks.
+
+	The condition is built on a comparator with hysteresis. For a rising
+	slope, the comparator turns on when the signal reaches level and turns
+	off when it drops below level - hysteresis; for a falling slope, it turns
+	on when the signal reaches down to level and off when it rises above
+	level + hysteresis. Depending on the mode, a trigger event is:
+
+	EDGE:  the sample at which the comparator turns on.
+	LEVEL: any sample at which the comparator is on.
+	PULSE: the sample at which the comparator turns off, if it has been on
+	       for at least min_width and at most max_width samples.
+
+	After each event, further events are ignored for holdoff samples.
+	Comparator, pulse, and holdoff state carry over from one block to the
+	next, so a stream may be split into blocks arbitrarily."""
+
+	EDGE = 'edge'
+	LEVEL = 'level'
+	PULSE = 'pulse'
+
+	RISING = 'rising'
+	FALLING = 'falling'
+
+	def __init__(self, mode=EDGE, slope=RISING, level=0., hysteresis=0.,
+			holdoff=0, min_width=0, max_width=None):
+		if mode not in (self.EDGE, self.LEVEL, self.PULSE):
+			raise ValueError('unknown trigger mode: %r' % (mode,))
+		if slope not in (self.RISING, self.FALLING):
+			raise ValueError('unknown trigger slope: %r' % (slope,))
+		if hysteresis < 0:
+			raise ValueError('hysteresis must be non-negative')
+		self.mode = mode
+		self.slope = slope
+		self.level = level
+		self.hysteresis = hysteresis
+		self.holdoff = holdoff
+		self.min_width = min_width
+		self.max_width = max_width
+		self.reset()
+
+	def reset(self):
+		"""Forget all state carried over from previous blocks."""
+		# Start out as if the comparator were on since an unknown time, so
+		# that a signal that is already past the level does not trigger.
+		self.__active = True
+		self.__pulse_start = None
+		self.last_index = None
+
+	def __comparator(self, y):
+		"""Return the state of the comparator after each sample in y."""
+		if self.slope == self.RISING:
+			on = y >= self.level
+			off = y < self.level - self.hysteresis
+		else:
+			on = y <= self.level
+			off = y > self.level + self.hysteresis
+		# Each sample that is past either threshold sets the state; samples
+		# in between keep the state of the last one that was.
+		n = len(y)
+		last_set = numpy.where(on | off, numpy.arange(n), -1)
+		numpy.maximum.accumulate(last_set, out=last_set)
+		return numpy.where(last_set >= 0, on[last_set], self.__active)
+
+	def __holdoff(self, candidates):
+		"""Thin out candidate events so that they are at least holdoff
+		samples apart from each other and from the last event."""
+		if self.last_index is not None:
+			candidates = candidates[candidates >= self.last_index + self.holdoff]
+		if self.holdoff <= 1 or len(candidates) == 0:
+			return candidates
+		# Every accepted event is at least holdoff samples after the last, so
+		# this loop runs at most once per accepted event.
+		result = []
+		k = 0
+		while k < len(candidates):
+			t = candidates[k]
+			result.append(t)
+			k += candidates[k:].searchsorted(t + self.holdoff)
+		return numpy.asarray(result, dtype=candidates.dtype)
+
+	def process(self, block, i0):
+		"""Process a block of samples, the first of which has index i0, and
+		return an array of the indices of the trigger events in it."""
+		y = numpy.ravel(block)
+		if len(y) == 0:
+			return numpy.empty(0, dtype=numpy.int64)
+		state = self.__comparator(y)
+		before = numpy.empty_like(state)
+		before[0] = self.__active
+		before[1:] = state[:-1]
+		on = numpy.flatnonzero(state & ~before) + i0
+		off = numpy.flatnonzero(before & ~state) + i0
+
+		if self.mode == self.EDGE:
+			candidates = on
+		elif self.mode == self.LEVEL:
+			candidates = numpy.flatnonzero(state) + i0
+		else:
+			# Pair each turn-off with the turn-on that precedes it. The start
+			# of a pulse that was already on when we started is unknown.
+			if self.__active:
+				start = -1 if self.__pulse_start is None else self.__pulse_start
+				starts = numpy.concatenate(([start], on))
+			else:
+				starts = on
+			if state[-1]:
+				self.__pulse_start = starts[-1] if starts[-1] >= 0 else None
+			starts = starts[:len(off)]
+			width = off - starts
+			ok = (starts >= 0) & (width >= self.min_width)
+			if self.max_width is not None:
+				ok &= width <= self.max_width
+			candidates = off[ok]
+
+		self.__active = state[-1]
+		events = self.__holdoff(candidates.astype(numpy.int64))
+		if len(events):
+			self.last_index = events[-1]
+		return events
+
+
+class Welch(object):
+	"""Streaming estimate of the one-sided power spectral density by Welch's
+	method. Samples are divided into overlapping segments of nfft samples;
+	each segment has its mean removed and is multiplied by a window that is
+	computed once up front, and the squared magnitudes of their real FFTs are
+	averaged. Blocks may be of any length: samples that do not yet fill a
+	segment are kept until the next block, so each segment is transformed
+	exactly once.
+
+	With LINEAR averaging, psd is the mean over all segments so far; with
+	EXPONENTIAL averaging, each new segment is mixed in with weight alpha."""
+
+	LINEAR = 'linear'
+	EXPONENTIAL = 'exponential'
+
+	def __init__(self, nfft, sample_rate=1., overlap=0.5, window=None,
+			averaging=LINEAR, alpha=0.1):
+		if averaging not in (self.LINEAR, self.EXPONENTIAL):
+			raise ValueError('unknown averaging: %r' % (averaging,))
+		if window is None:
+			window = numpy.hanning(nfft)
+		window = numpy.asarray(window, dtype=float)
+		if window.shape != (nfft,):
+			raise ValueError('window must have nfft samples')
+		self.step = nfft - int(round(overlap * nfft))
+		if not 0 < self.step <= nfft:
+			raise ValueError('overlap must be in the range [0, 1)')
+		self.nfft = nfft
+		self.sample_rate = float(sample_rate)
+		self.window = window
+		self.averaging = averaging
+		self.alpha = alpha
+		self.freqs = numpy.fft.rfftfreq(nfft, 1 / self.sample_rate)
+
+		# Scale to a one-sided density; the DC and (for even nfft) Nyquist
+		# bins are not doubled.
+		self.__scale = numpy.full(len(self.freqs), 2 / (self.sample_rate * (window ** 2).sum()))
+		self.__scale[0] /= 2
+		if nfft % 2 == 0:
+			self.__scale[-1] /= 2
+		self.reset()
+
+	def reset(self):
+		"""Discard all samples and the average."""
+		self.__pending = numpy.empty(0)
+		self.__sum = numpy.zeros(len(self.freqs))
+		self.count = 0
+		self.psd = None
+
+	def process(self, block):
+		"""Add a block of samples, update psd with every segment that is now
+		complete, and return the number of new segments."""
+		data = numpy.concatenate((self.__pending, numpy.ravel(block)))
+		n = (len(data) - self.nfft) // self.step + 1 if len(data) >= self.nfft else 0
+		if n > 0:
+			segments = numpy.lib.stride_tricks.as_strided(data,
+				shape=(n, self.nfft), strides=(self.step * data.strides[0], data.strides[0]))
+			segments = segments - segments.mean(axis=1)[:, numpy.newaxis]
+			segments *= self.window
+			spectra = numpy.fft.rfft(segments, axis=1)
+			spectra = (spectra.real ** 2 + spectra.imag ** 2) * self.__scale
+
+			if self.averaging == self.LINEAR:
+				self.__sum += spectra.sum(axis=0)
+				self.psd = self.__sum / (self.count + n)
+			else:
+				if self.psd is None:
+					self.psd = spectra[0]
+					spectra = spectra[1:]
+				m = len(spectra)
+				weights = self.alpha * (1 - self.alpha) ** numpy.arange(m - 1, -1, -1)
+				self.psd = (1 - self.alpha) ** m * self.psd + numpy.dot(weights, spectra)
+			self.count += n
+		self.__pending = data[n * self.step:].copy()
+		return n
+
+
+def log_spectrum_envelope(freqs, values, columns):
+	"""Bin a spectrum onto a logarithmic frequency axis that spans the given
+	number of pixel columns from the first to the last frequency, which must
+	be positive and increasing. Where several bins fall in one column, the
+	column contributes a vertex at its minimum and one at its maximum, at its
+	center; where one bin does, both vertices are at its exact position.
+
+	Return a pair of arrays, the x coordinates in columns and the values of
+	the vertices."""
+	lf = numpy.log10(freqs)
+	span = lf[-1] - lf[0]
+	x = (lf - lf[0]) * (columns / span if span > 0 else 0.)
+	col = numpy.minimum(x.astype(numpy.intp), columns - 1)
+	starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(col)) + 1))
+	counts = numpy.diff(numpy.append(starts, len(col)))
+	xv = numpy.where(counts == 1, x[starts], col[starts] + 0.5)
+	lo = numpy.fmin.reduceat(values, starts)
+	hi = numpy.fmax.reduceat(values, starts)
+	return numpy.repeat(xv, 2), numpy.column_stack((lo, hi)).ravel()
+
+
+class Measurements(object):
+	"""Streaming automatic measurements of the most recent samples of a
+	trace: mean, RMS, minimum, maximum, peak-to-peak, zero-crossing rate, and
+	dominant frequency. Samples are summarized as they arrive in chunks of
+	chunk samples; each chunk keeps its number of samples and of finite
+	samples, their sum, sum of squares, minimum, and maximum, and the number
+	of zero crossings. The measurements combine the summaries of the last
+	window // chunk chunks and of the chunk being filled, so that no sample
+	is read twice and the window slides without running sums drifting. The
+	dominant frequency is the peak of an exponentially averaged Welch
+	spectrum of nfft samples. Non-finite samples are ignored."""
+
+	def __init__(self, sample_rate=1., window=1 << 16, chunk=1 << 10, nfft=1024):
+		if chunk <= 0:
+			raise ValueError('chunk must be positive')
+		self.sample_rate = float(sample_rate)
+		self.chunk = chunk
+		self.spectrum = Welch(nfft, sample_rate, averaging=Welch.EXPONENTIAL)
+		self.__chunks = collections.deque(maxlen=max(1, window // chunk))
+		self.reset()
+
+	def reset(self):
+		"""Discard all samples."""
+		self.__chunks.clear()
+		self.__pending = numpy.empty(0)
+		self.__pending_crossings = numpy.empty(0, dtype=bool)
+		self.__last = numpy.nan
+		self.spectrum.reset()
+		self.processed = 0
+
+	@staticmethod
+	def __summarize(y, crossings):
+		"""Return the summaries of the rows of the 2D array y, which has the
+		zero-crossing flags crossings."""
+		finite = numpy.isfinite(y)
+		y0 = numpy.where(finite, y, 0.)
+		summary = numpy.empty((len(y), 7))
+		summary[:, 0] = y.shape[1]
+		summary[:, 1] = finite.sum(axis=1)
+		summary[:, 2] = y0.sum(axis=1)
+		summary[:, 3] = (y0 * y0).sum(axis=1)
+		summary[:, 4] = numpy.where(finite, y, numpy.inf).min(axis=1)
+		summary[:, 5] = numpy.where(finite, y, -numpy.inf).max(axis=1)
+		summary[:, 6] = crossings.sum(axis=1)
+		return summary
+
+	def process(self, block):
+		"""Add a block of samples."""
+		block = numpy.ravel(block).astype(float)
+		if not len(block):
+			return
+		# A crossing is a change of sign between consecutive finite samples,
+		# including the last sample of the previous block.
+		y = numpy.concatenate(([self.__last], block))
+		finite = numpy.isfinite(y)
+		negative = y < 0
+		crossings = (negative[1:] != negative[:-1]) & finite[1:] & finite[:-1]
+		self.__last = block[-1]
+		self.spectrum.process(block[finite[1:]])
+		self.processed += len(block)
+
+		data = numpy.concatenate((self.__pending, block))
+		crossings = numpy.concatenate((self.__pending_crossings, crossings))
+		m = len(data) // self.chunk
+		# Only the newest chunks are kept, so only they are summarized.
+		first = max(0, m - self.__chunks.maxlen)
+		if m > first:
+			lo, hi = first * self.chunk, m * self.chunk
+			self.__chunks.extend(self.__summarize(
+				data[lo:hi].reshape(-1, self.chunk),
+				crossings[lo:hi].reshape(-1, self.chunk)))
+		self.__pending = data[m * self.chunk:].copy()
+		self.__pending_crossings = crossings[m * self.chunk:].copy()
+
+	def results(self):
+		"""Return a dictionary of the measurements over the window, with keys
+		'samples', 'mean', 'rms', 'min', 'max', 'peak_to_peak',
+		'zero_crossing_rate' (crossings per unit time), and
+		'dominant_frequency'. Measurements that are not yet defined are NaN."""
+		summaries = list(self.__chunks)
+		if len(self.__pending):
+			summaries.extend(self.__summarize(self.__pending[numpy.newaxis],
+				self.__pending_crossings[numpy.newaxis]))
+		nan = numpy.nan
+		result = dict(samples=0, mean=nan, rms=nan, min=nan, max=nan,
+			peak_to_peak=nan, zero_crossing_rate=nan, dominant_frequency=nan)
+		if summaries:
+			n, count, total, squares, lo, hi, crossings = numpy.array(summaries).sum(axis=0)
+			result['samples'] = int(n)
+			result['zero_crossing_rate'] = float(crossings * self.sample_rate / n)
+			if count:
+				summaries = numpy.array(summaries)
+				result['mean'] = float(total / count)
+				result['rms'] = math.sqrt(squares / count)
+				result['min'] = float(summaries[:, 4].min())
+				result['max'] = float(summaries[:, 5].max())
+				result['peak_to_peak'] = result['max'] - result['min']
+		psd = self.spectrum.psd
+		if psd is not None and len(psd) > 1:
+			result['dominant_frequency'] = float(self.spectrum.freqs[1 + numpy.argmax(psd[1:])])
+		return result
+
+
+class MathChannel(object):
+	"""Channel derived sample by sample from other channels by an arithmetic
+	expression, such as 'H1:DMT-STRAIN - L1:DMT-STRAIN' or '0.5 * (A + B)'.
+	inputs maps the names of channels to their buffers; a name that appears in
+	the expression, bounded by characters that cannot be part of an
+	identifier, refers to that channel. The expression may use numbers, the
+	operators + - * / **, parentheses, and the functions in FUNCTIONS.
+
+	The expression is compiled once to a list of numpy ufunc calls that write
+	into scratch arrays, which are reused from one block to the next and
+	grow only when a block is longer than any before it. Each call to
+	update() evaluates only the samples that all of the inputs have and that
+	have not been evaluated yet. The channels must share sample indices, as
+	traces with the same sample rate that are fed by an Acquisition do.
+	Samples that an input is missing, in the gaps between the segments of
+	a SegmentedChannel or the chunks of a recording, are taken to be NaN."""
+
+	"""Functions that may be called in expressions"""
+	FUNCTIONS = {
+		'abs': numpy.absolute,
+		'sqrt': numpy.sqrt,
+		'exp': numpy.exp,
+		'log': numpy.log,
+		'log10': numpy.log10,
+		'sin': numpy.sin,
+		'cos': numpy.cos,
+	}
+
+	__OPERATORS = {
+		ast.Add: numpy.add,
+		ast.Sub: numpy.subtract,
+		ast.Mult: numpy.multiply,
+		ast.Div: numpy.true_divide,
+		ast.Pow: numpy.power,
+		ast.USub: numpy.negative,
+		ast.UAdd: numpy.positive,
+	}
+
+	def __init__(self, expression, inputs):
+		self.expression = expression
+		# Replace the names of channels, longest first so that a name that
+		# contains another wins, with identifiers that Python can parse.
+		names = sorted(inputs, key=len, reverse=True)
+		placeholders = {}
+		for k, name in enumerate(names):
+			placeholder = '__channel%d' % k
+			expression, count = re.subn(r'(?<!\w)%s(?!\w)' % re.escape(name), placeholder, expression)
+			if count:
+				placeholders[placeholder] = name
+		try:
+			tree = ast.parse(expression.strip(), mode='eval')
+		except SyntaxError as e:
+			raise ValueError('cannot parse expression %r: %s' % (self.expression, e))
+		self.names = []
+		self.__steps = []
+		self.__slots = 0
+		self.__placeholders = placeholders
+		self.__result = self.__compile(tree.body)
+		if not self.names:
+			raise ValueError('expression %r does not refer to any channel' % (self.expression,))
+		self.inputs = [inputs[name] for name in self.names]
+		for buffer in self.inputs:
+			if buffer.channels is not None:
+				raise ValueError('inputs of a math channel must have one channel')
+		self.__scratch = [numpy.empty(0) for _ in range(self.__slots + len(self.names))]
+		# Start with the oldest sample that all of the inputs still have.
+		self.total = max(buffer.total - len(buffer) for buffer in self.inputs)
+
+	def __compile(self, node):
+		"""Append the steps that evaluate node, and return a reference to
+		its value: ('const', value), ('input', k), or ('slot', k)."""
+		constant = getattr(ast, 'Constant', None)
+		if constant is not None and isinstance(node, constant) and isinstance(node.value, (int, float)):
+			return ('const', float(node.value))
+		if isinstance(node, getattr(ast, 'Num', ())):
+			return ('const', float(node.n))
+		if isinstance(node, ast.Name):
+			if node.id in self.__placeholders:
+				name = self.__placeholders[node.id]
+				if name not in self.names:
+					self.names.append(name)
+				return ('input', self.names.index(name))
+			raise ValueError('unknown channel or constant %r in %r' % (node.id, self.expression))
+		if isinstance(node, ast.BinOp) and type(node.op) in self.__OPERATORS:
+			return self.__step(self.__OPERATORS[type(node.op)], [node.left, node.right])
+		if isinstance(node, ast.UnaryOp) and type(node.op) in self.__OPERATORS:
+			return self.__step(self.__OPERATORS[type(node.op)], [node.operand])
+		if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+				and node.func.id in self.FUNCTIONS and len(node.args) == 1 and not node.keywords:
+			return self.__step(self.FUNCTIONS[node.func.id], node.args)
+		raise ValueError('unsupported syntax in %r' % (self.expression,))
+
+	def __step(self, func, operands):
+		args = [self.__compile(operand) for operand in operands]
+		if all(kind == 'const' for kind, value in args):
+			return ('const', float(func(*[value for kind, value in args])))
+		# Write the result over the temporary of an operand if there is one,
+		# and otherwise into a new one.
+		slots = [value for kind, value in args if kind == 'slot']
+		if slots:
+			slot = slots[0]
+		else:
+			slot = self.__slots
+			self.__slots += 1
+		self.__steps.append((func, args, slot))
+		return ('slot', slot)
+
+	def __scratch_view(self, k, n):
+		"""Return the first n samples of scratch array k, growing it if
+		needed."""
+		if len(self.__scratch[k]) < n:
+			self.__scratch[k] = numpy.empty(max(n, 2 * len(self.__scratch[k])))
+		return self.__scratch[k][:n]
+
+	def update(self):
+		"""Evaluate the samples that all of the inputs have that have not been
+		evaluated yet. Return a pair of the index of the first of them and an
+		array of their values, or None if there are none. The array may be
+		overwritten by the next call."""
+		start = max([self.total] + [buffer.total - len(buffer) for buffer in self.inputs])
+		stop = min(buffer.total for buffer in self.inputs)
+		if start >= stop:
+			return None
+		n = stop - start
+		inputs = []
+		for k, buffer in enumerate(self.inputs):
+			window = buffer.window(start, stop)
+			if len(window) == 1 and window[0][0] == start and len(window[0][1]) == n:
+				inputs.append(window[0][1])
+			else:
+				# Copy the parts to their offsets, leaving NaN in any gaps.
+				y = self.__scratch_view(self.__slots + k, n)
+				if sum(len(part) for i0, part in window) < n:
+					y.fill(numpy.nan)
+				for i0, part in window:
+					y[i0 - start:i0 - start + len(part)] = part
+				inputs.append(y)
+		slots = [self.__scratch_view(k, n) for k in range(self.__slots)]
+		refs = {'input': inputs, 'slot': slots}
+
+		with numpy.errstate(all='ignore'):
+			for func, args, slot in self.__steps:
+				func(*[value if kind == 'const' else refs[kind][value] for kind, value in args], out=slots[slot])
+		kind, value = self.__result
+		self.total = stop
+		return start, refs[kind][value]
+
+
+class FrameStats(object):
+	"""Ring buffer of paint statistics for the most recent frames. For each
+	frame, it records the wall time at which painting began, the total paint
+	time, the depth of the acquisition queue, and, for each actor that was
+	painted, its paint time, the number of vertices it emitted, and the number
+	of samples (or pyramid nodes) it read. Recording is off until enabled is
+	set."""
+
+	def __init__(self, capacity=256):
+		self.enabled = False
+		self.__frames = collections.deque(maxlen=capacity)
+		self.__current = None
+
+	def begin_frame(self):
+		if self.enabled:
+			self.__current = {'start': timeit.default_timer(), 'actors': {}}
+
+	def record(self, name, seconds, vertices=0, samples=0):
+		"""Add the cost of painting an actor to the current frame."""
+		if self.__current is not None:
+			actor = self.__current['actors'].setdefault(name, [0., 0, 0])
+			actor[0] += seconds
+			actor[1] += vertices
+			actor[2] += samples
+
+	def end_frame(self, queue_depth=0):
+		frame = self.__current
+		if frame is not None:
+			frame['seconds'] = timeit.default_timer() - frame['start']
+			frame['queue_depth'] = queue_depth
+			frame['actors'] = dict((name, {'seconds': seconds, 'vertices': vertices, 'samples': samples})
+				for name, (seconds, vertices, samples) in frame['actors'].items())
+			self.__frames.append(frame)
+			self.__current = None
+
+	def clear(self):
+		self.__frames.clear()
+
+	def frames(self):
+		"""Return a list of the recorded frames, oldest first. Each frame is a
+		dictionary with keys 'start', 'seconds', 'queue_depth', and 'actors',
+		which maps actor names to dictionaries with keys 'seconds',
+		'vertices', and 'samples'."""
+		return list(self.__frames)
+
+	def summary(self):
+		"""Return a dictionary of statistics over the recorded frames: 'fps',
+		'mean_seconds' and 'worst_seconds' per frame, the latest
+		'queue_depth', and 'actors', which maps each actor name to its mean
+		'seconds', 'vertices', and 'samples' per frame."""
+		frames = self.__frames
+		result = {'fps': 0., 'mean_seconds': 0., 'worst_seconds': 0., 'queue_depth': 0, 'actors': {}}
+		if not frames:
+			return result
+		n = len(frames)
+		if n > 1 and frames[-1]['start'] > frames[0]['start']:
+			result['fps'] = (n - 1) / (frames[-1]['start'] - frames[0]['start'])
+		seconds = [frame['seconds'] for frame in frames]
+		result['mean_seconds'] = sum(seconds) / n
+		result['worst_seconds'] = max(seconds)
+		result['queue_depth'] = frames[-1]['queue_depth']
+		actors = result['actors']
+		for frame in frames:
+			for name, cost in frame['actors'].items():
+				total = actors.setdefault(name, {'seconds': 0., 'vertices': 0., 'samples': 0.})
+				for key in total:
+					total[key] += cost[key]
+		for total in actors.values():
+			for key in total:
+				total[key] /= n
+		return result
+frame_stats = FrameStats()
+
+
+class QualityGovernor(object):
+	"""Lowers rendering quality step by step when painting takes longer than
+	a frame budget, and raises it again when there is headroom, so that the
+	frame rate degrades gracefully under load. It is driven by the measured
+	paint time of each frame, passed to update().
+
+	The quality level is the number of steps, taken in the order given by
+	steps, that are in effect. The steps are LABELS (stop refreshing the
+	text of labels), TICKS (leave out the short ticks of the graticule), and
+	DENSITY (halve the number of vertices of zoomed-out traces; it may be
+	listed more than once). The level is raised when the mean paint time
+	over the last window frames exceeds the budget, and lowered when it is
+	below restore times the budget; after each change, the window starts
+	over and the level is held for at least hold frames, so that it does
+	not oscillate."""
+
+	LABELS = 'labels'
+	TICKS = 'ticks'
+	DENSITY = 'density'
+
+	"""Default order in which quality is lowered"""
+	STEPS = (LABELS, DENSITY, TICKS, DENSITY, DENSITY)
+
+	def __init__(self, target_fps=60., steps=STEPS, window=8, hold=15,
+			restore=0.6, history=64):
+		for step in steps:
+			if step not in (self.LABELS, self.TICKS, self.DENSITY):
+				raise ValueError('unknown quality step: %r' % (step,))
+		if not 0 < restore < 1:
+			raise ValueError('restore must be in the range (0, 1)')
+		self.budget = 1. / target_fps
+		self.steps = tuple(steps)
+		self.hold = hold
+		self.restore = restore
+		self.__times = collections.deque(maxlen=window)
+		self.__decisions = collections.deque(maxlen=history)
+		self.level = 0
+		self.frame = 0
+		self.__changed = 0
+
+	def reset(self):
+		"""Return to full quality and forget the measurements."""
+		self.__times.clear()
+		self.level = 0
+		self.__changed = self.frame
+
+	def __active(self, step):
+		return step in self.steps[:self.level]
+
+	@property
+	def label_refresh(self):
+		"""Whether labels should refresh their text."""
+		return not self.__active(self.LABELS)
+
+	@property
+	def tick_detail(self):
+		"""Whether the graticule should draw its short ticks."""
+		return not self.__active(self.TICKS)
+
+	@property
+	def vertex_scale(self):
+		"""Factor by which to widen the buckets of zoomed-out traces."""
+		return 2 ** self.steps[:self.level].count(self.DENSITY)
+
+	def update(self, seconds):
+		"""Record the paint time of a frame. Return True if the quality level
+		changed."""
+		self.frame += 1
+		self.__times.append(seconds)
+		if len(self.__times) < self.__times.maxlen or self.frame - self.__changed < self.hold:
+			return False
+		mean = sum(self.__times) / len(self.__times)
+		if mean > self.budget and self.level < len(self.steps):
+			level = self.level + 1
+		elif mean < self.restore * self.budget and self.level > 0:
+			level = self.level - 1
+		else:
+			return False
+		self.__decisions.append({'frame': self.frame, 'mean_seconds': mean,
+			'from': self.level, 'to': level,
+			'step': self.steps[max(level, self.level) - 1]})
+		self.level = level
+		self.__changed = self.frame
+		# Judge the new level only by frames painted at it.
+		self.__times.clear()
+		return True
+
+	def decisions(self):
+		"""Return a list of the most recent changes of level, oldest first.
+		Each is a dictionary with keys 'frame', 'mean_seconds' (the mean paint
+		time that prompted it), 'from' and 'to' (the levels), and 'step' (the
+		step that was taken or undone)."""
+		return list(self.__decisions)
+
+	def state(self):
+		"""Return a dictionary of the current state: 'level', 'budget',
+		'mean_seconds' (over the window), 'label_refresh', 'tick_detail', and
+		'vertex_scale'."""
+		times = self.__times
+		return {
+			'level': self.level,
+			'budget': self.budget,
+			'mean_seconds': sum(times) / len(times) if times else 0.,
+			'label_refresh': self.label_refresh,
+			'tick_detail': self.tick_detail,
+			'vertex_scale': self.vertex_scale,
+		}
+
+
+class BlockQueue(object):
+	"""Bounded, thread-safe queue of (key, block) pairs that carries sample
+	blocks from producer threads to the UI thread. When the queue is full,
+	put() either discards the oldest queued block (DROP_OLDEST), discards the
+	block being put (DROP_NEWEST), or waits for room (BLOCK). Discarded blocks
+	are counted, in total and by key."""
+
+	DROP_OLDEST = 'drop-oldest'
+	DROP_NEWEST = 'drop-newest'
+	BLOCK = 'block'
+
+	def __init__(self, maxsize=64, policy=DROP_OLDEST):
+		if policy not in (self.DROP_OLDEST, self.DROP_NEWEST, self.BLOCK):
+			raise ValueError('unknown backpressure policy: %r' % (policy,))
+		if maxsize <= 0:
+			raise ValueError('maxsize must be positive')
+		self.maxsize = maxsize
+		self.policy = policy
+		self.dropped = 0
+		self.dropped_by_key = collections.defaultdict(int)
+		self.__items = collections.deque()
+		self.__condition = threading.Condition()
+		self.__closed = False
+
+	def __len__(self):
+		return len(self.__items)
+
+	def __drop(self, key):
+		self.dropped += 1
+		self.dropped_by_key[key] += 1
+
+	def put(self, key, block):
+		"""Queue a block. Return True if it was queued, or False if it was
+		discarded or the queue was closed while waiting for room."""
+		with self.__condition:
+			if self.__closed:
+				return False
+			if len(self.__items) >= self.maxsize:
+				if self.policy == self.DROP_NEWEST:
+					self.__drop(key)
+					return False
+				elif self.policy == self.DROP_OLDEST:
+					self.__drop(self.__items.popleft()[0])
+				else:
+					while len(self.__items) >= self.maxsize and not self.__closed:
+						self.__condition.wait()
+					if self.__closed:
+						return False
+			self.__items.append((key, block))
+			self.__condition.notify_all()
+			return True
+
+	def wait(self):
+		"""Wait until a block is queued or the queue is closed, for consumers
+		that run on their own thread. Return True if there are blocks
+		queued, or False if the queue is closed and empty."""
+		with self.__condition:
+			while not self.__items and not self.__closed:
+				self.__condition.wait()
+			return bool(self.__items)
+
+	def drain(self):
+		"""Remove and return all queued (key, block) pairs, oldest first."""
+		with self.__condition:
+			items = list(self.__items)
+			self.__items.clear()
+			self.__condition.notify_all()
+		return items
+
+	def close(self):
+		"""Refuse further blocks and wake up any producers that are waiting
+		for room."""
+		with self.__condition:
+			self.__closed = True
+			self.__condition.notify_all()
+
+
+class Acquisition(object):
+	"""Reads sample blocks on producer threads so that slow sources do not
+	stall the UI thread. Each source is a callable that waits until it has a
+	block of samples and returns it, or returns None at the end of the
+	stream. Blocks are passed through a BlockQueue, and drain() appends them
+	to their traces; call it once per frame on the UI thread."""
+
+	def __init__(self, maxsize=64, policy=BlockQueue.DROP_OLDEST):
+		self.queue = BlockQueue(maxsize, policy)
+		self.__threads = []
+		self.__stopping = threading.Event()
+
+	def __run(self, trace, read, start):
+		# Number the samples as they are read, so that those of blocks that
+		# the queue drops are still counted.
+		while not self.__stopping.is_set():
+			block = read()
+			if block is None:
+				break
+			self.queue.put(trace, (start, block))
+			start += numpy.shape(block)[-1]
+
+	def add_source(self, trace, read):
+		"""Start a producer thread that feeds blocks returned by read to
+		trace. The samples keep the indices that they have in the stream:
+		a block that is dropped leaves a gap in the trace, so that traces
+		whose sources share a time base stay in step."""
+		thread = threading.Thread(target=self.__run, args=(trace, read, trace.buffer.total))
+		thread.daemon = True
+		self.__threads.append(thread)
+		thread.start()
+
+	def stop(self, timeout=None):
+		"""Ask the producer threads to finish and wait for them."""
+		self.__stopping.set()
+		self.queue.close()
+		for thread in self.__threads:
+			thread.join(timeout)
+		self.__threads = [thread for thread in self.__threads if thread.is_alive()]
+
+	def drain(self):
+		"""Append all queued blocks to their traces, joining consecutive blocks
+		for the same trace so that each trace is appended to once per run of
+		blocks with no dropped blocks between them. Return the number of
+		blocks drained."""
+		items = self.queue.drain()
+		runs = collections.OrderedDict()
+		for trace, (start, block) in items:
+			# Blocks for a TraceCollection have a row per channel.
+			if trace.buffer.channels is None:
+				block = numpy.ravel(block)
+			trace_runs = runs.setdefault(trace, [])
+			if trace_runs and trace_runs[-1][1] == start:
+				trace_runs[-1][1] += block.shape[-1]
+				trace_runs[-1][2].append(block)
+			else:
+				trace_runs.append([start, start + block.shape[-1], [block]])
+		for trace, trace_runs in runs.items():
+			for start, stop, blocks in trace_runs:
+				trace.append_block(start, numpy.concatenate(blocks, axis=-1))
+		return len(items)
@@ -0,0 +1,147 @@
+"""
+ClutterScope parallel processing: keeps the ring buffers of channels in shared
+memory and runs per-channel work, such as decimation and spectra, on a pool
+of worker processes. Only small descriptions of the buffers are sent to the
+workers, and only their small, render-ready results are sent back; the
+samples themselves are never pickled.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import numpy
+from clutterscope.data import RingBuffer, trace_envelope, Welch
+
+
+class SharedRingBuffer(RingBuffer):
+	"""RingBuffer whose samples are kept in a block of shared memory, so that
+	worker processes can read them without copying. The process that creates
+	it is the only one that appends to it; handle() describes its current
+	contents for a worker, which reads them through attach().
+
+	Appending overwrites the oldest samples, so do not append while work that
+	reads them is outstanding."""
+
+	def __init__(self, capacity, dtype=numpy.float64, channels=None):
+		dtype = numpy.dtype(dtype)
+		shape = (capacity,) if channels is None else (channels, capacity)
+		self.__shm = shared_memory.SharedMemory(create=True,
+			size=max(1, int(numpy.prod(shape)) * dtype.itemsize))
+		storage = numpy.ndarray(shape, dtype=dtype, buffer=self.__shm.buf)
+		super(SharedRingBuffer, self).__init__(capacity, dtype, channels, storage)
+
+	@property
+	def name(self):
+		"""Name of the block of shared memory."""
+		return self.__shm.name
+
+	def handle(self):
+		"""Return a small, picklable description of the buffer and of the
+		samples that are in it now, for attach()."""
+		return (self.name, self.capacity, self.dtype.str, self.channels, self.total, len(self))
+
+	def close(self):
+		"""Release the shared memory. The buffer may not be used afterwards."""
+		self.__shm.close()
+		self.__shm.unlink()
+
+
+"""Blocks of shared memory that this process has attached to, by name"""
+_attached = {}
+
+
+def attach(handle):
+	"""Return a RingBuffer that reads the samples of the SharedRingBuffer
+	described by handle, in place. The block of shared memory stays mapped for
+	the life of the process, so attaching again to the same buffer is cheap."""
+	name, capacity, dtype, channels, total, count = handle
+	try:
+		shm = _attached[name]
+	except KeyError:
+		try:
+			shm = shared_memory.SharedMemory(name, track=False)
+		except TypeError:
+			# Before Python 3.13, attaching registers the block with the
+			# resource tracker again. The workers of a ChannelPool share
+			# their creator's tracker, so that is harmless; unregistering
+			# here would drop the creator's own registration.
+			shm = shared_memory.SharedMemory(name)
+		_attached[name] = shm
+	shape = (capacity,) if channels is None else (channels, capacity)
+	storage = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+	return RingBuffer(capacity, dtype, channels, storage, total, count)
+
+
+def channel_envelope(buffer, start, stop, bucket):
+	"""Return the min/max envelope of the samples in buffer with indices in the
+	half-open range [start, stop), as trace_envelope does."""
+	return trace_envelope(buffer, None, start, stop, bucket)
+
+
+def channel_spectrum(buffer, start, stop, nfft, sample_rate=1., overlap=0.5):
+	"""Return the frequencies and the power spectral density, estimated by
+	Welch's method, of the samples in buffer with indices in the half-open
+	range [start, stop). The density is None if there are fewer than nfft
+	samples."""
+	welch = Welch(nfft, sample_rate, overlap)
+	for i0, y in buffer.window(start, stop):
+		welch.process(y)
+	return welch.freqs, welch.psd
+
+
+def _run(job):
+	func, handle, args = job
+	return func(attach(handle), *args)
+
+
+class ChannelPool(object):
+	"""Pool of worker processes (by default, one per CPU) that runs
+	per-channel work on SharedRingBuffers. Each job is a tuple of a buffer
+	and extra arguments; the worker calls func(buffer, *args) with a
+	RingBuffer over the same shared memory, and its return value is sent
+	back. func must be a function at the top level of a module, such as
+	channel_envelope or channel_spectrum, so that it can be pickled."""
+
+	def __init__(self, processes=None):
+		# Start the resource tracker first, so that the workers share it
+		# rather than each starting their own, which would unlink the
+		# buffers that they attach to when they exit.
+		resource_tracker.ensure_running()
+		self.__pool = multiprocessing.Pool(processes)
+		self.__buffers = []
+
+	def buffer(self, capacity, dtype=numpy.float64, channels=None):
+		"""Return a new SharedRingBuffer, which is released when the pool is
+		closed."""
+		buffer = SharedRingBuffer(capacity, dtype, channels)
+		self.__buffers.append(buffer)
+		return buffer
+
+	@staticmethod
+	def __jobs(func, jobs):
+		return [(func, job[0].handle(), tuple(job[1:])) for job in jobs]
+
+	def map(self, func, jobs):
+		"""Run func on each job in the workers, and return the list of
+		results in the same order."""
+		return self.__pool.map(_run, self.__jobs(func, jobs), chunksize=1)
+
+	def map_async(self, func, jobs):
+		"""Like map, but return a multiprocessing AsyncResult at once, so that
+		other work can be done while the workers run."""
+		return self.__pool.map_async(_run, self.__jobs(func, jobs), chunksize=1)
+
+	def envelopes(self, buffers, start, stop, bucket):
+		"""Return the envelopes of the samples in each of buffers with indices
+		in the half-open range [start, stop), computed in parallel."""
+		return self.map(channel_envelope, [(buffer, start, stop, bucket) for buffer in buffers])
+
+	def close(self):
+		"""Stop the workers and release the buffers."""
+		self.__pool.close()
+		self.__pool.join()
+		for buffer in self.__buffers:
+			buffer.close()
+		self.__buffers = []
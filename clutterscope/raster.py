@@ -0,0 +1,261 @@
+"""
+ClutterScope software rasterizer: renders scope snapshots to image arrays and
+PNG files with numpy alone, without a display, in the same layout as the
+Clutter user interface.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import colorsys
+import math
+import multiprocessing
+import struct
+import zlib
+import numpy
+from clutterscope.data import (MAJOR_PIXELS, BACKGROUND_COLOR,
+	GRIDLINE_COLOR, TRACE_COLOR, LABEL_SIZE, LABEL_SPACING, graticule_lines,
+	scale_for_level, samples_per_pixel, minmax_envelope)
+
+
+"""Colors that can be given by name, as in X11's rgb.txt"""
+NAMED_COLORS = {
+	'black': (0, 0, 0),
+	'white': (255, 255, 255),
+	'red': (255, 0, 0),
+	'green': (0, 255, 0),
+	'blue': (0, 0, 255),
+	'cyan': (0, 255, 255),
+	'magenta': (255, 0, 255),
+	'yellow': (255, 255, 0),
+	'orange': (255, 165, 0),
+	'gray': (190, 190, 190),
+	'grey': (190, 190, 190),
+}
+
+
+def parse_color(str):
+	"""Return the (red, green, blue, alpha) of a color given by name or as
+	#rgb, #rrggbb, or #rrggbbaa."""
+	if str.startswith('#'):
+		digits = str[1:]
+		if len(digits) == 3:
+			digits = ''.join(c + c for c in digits)
+		if len(digits) == 6:
+			digits += 'ff'
+		if len(digits) != 8:
+			raise ValueError('bad color: %r' % (str,))
+		return tuple(int(digits[k:k + 2], 16) for k in range(0, 8, 2))
+	try:
+		return NAMED_COLORS[str.lower()] + (255,)
+	except KeyError:
+		raise ValueError('unknown color: %r' % (str,))
+
+
+def darken(color):
+	"""Return a darker shade of a color, as Clutter.Color.darken does."""
+	r, g, b, a = color
+	h, l, s = colorsys.rgb_to_hls(r / 255., g / 255., b / 255.)
+	r, g, b = colorsys.hls_to_rgb(h, min(1., l * 0.7), min(1., s * 0.7))
+	return int(r * 255), int(g * 255), int(b * 255), a
+
+
+def segment_coverage(segments, width, height):
+	"""Rasterize line segments, given as an array of rows (x1, y1, x2, y2) in
+	pixel coordinates, onto a width by height grid with Wu's anti-aliasing.
+	All of the segments are stepped through at once, one pixel at a time
+	along their longer axes; at each step the two pixels that straddle the
+	line across the shorter axis share the coverage. Return a pair of arrays,
+	the flat indices (row * width + column) of the covered pixels, in
+	increasing order, and their coverage, from 0 to 1."""
+	segments = numpy.asarray(segments, dtype=float).reshape(-1, 4)
+	segments = segments[numpy.isfinite(segments).all(axis=1)]
+	# Pixel centers are at half-integer coordinates.
+	x1, y1, x2, y2 = (segments - 0.5).T
+	steep = abs(y2 - y1) > abs(x2 - x1)
+	# Step along u, the longer axis, and interpolate v, the shorter one.
+	u1 = numpy.where(steep, y1, x1)
+	v1 = numpy.where(steep, x1, y1)
+	u2 = numpy.where(steep, y2, x2)
+	v2 = numpy.where(steep, x2, y2)
+	du = u2 - u1
+	gradient = numpy.where(du != 0, (v2 - v1) / numpy.where(du != 0, du, 1), 0)
+	ustart = numpy.round(numpy.minimum(u1, u2))
+	ustop = numpy.round(numpy.maximum(u1, u2))
+	# Clip the number of steps so that a wild segment cannot blow up memory.
+	steps = numpy.clip(ustop - ustart + 1, 1, width + height).astype(numpy.intp)
+	segment = numpy.repeat(numpy.arange(len(steps)), steps)
+	first = numpy.cumsum(steps) - steps
+	u = ustart[segment] + (numpy.arange(len(segment)) - first[segment])
+	v = v1[segment] + gradient[segment] * (u - u1[segment])
+	v0 = numpy.floor(v)
+	frac = v - v0
+	steep = steep[segment]
+
+	indices = []
+	weights = []
+	for dv, weight in ((0, 1 - frac), (1, frac)):
+		vv = v0 + dv
+		col = numpy.where(steep, vv, u).astype(numpy.intp)
+		row = numpy.where(steep, u, vv).astype(numpy.intp)
+		inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+		indices.append(row[inside] * width + col[inside])
+		weights.append(weight[inside])
+	# Sum the coverage of pixels that are hit more than once.
+	indices, inverse = numpy.unique(numpy.concatenate(indices), return_inverse=True)
+	coverage = numpy.bincount(inverse, weights=numpy.concatenate(weights), minlength=len(indices))
+	return indices, numpy.minimum(coverage, 1)
+
+
+def round_rectangle_mask(width, height, radius):
+	"""Return the coverage of a width by height rectangle with rounded
+	corners, sampled at pixel centers."""
+	x = numpy.arange(width) + 0.5
+	y = numpy.arange(height)[:, numpy.newaxis] + 0.5
+	dx = numpy.maximum(numpy.maximum(radius - x, x - (width - radius)), 0)
+	dy = numpy.maximum(numpy.maximum(radius - y, y - (height - radius)), 0)
+	return (dx * dx + dy * dy <= radius * radius).astype(float)
+
+
+class RasterTrace(object):
+	"""A trace to be drawn by the software rasterizer, with the same meaning
+	as the corresponding state of a Trace. samples is a 1D array of samples
+	with indices 0 through len(samples) - 1; unless origin, the index of the
+	sample drawn at x = 0, is given, the samples span the graticule as in a
+	Trace, newest on the right. position is the (x, y) offset of the trace
+	in pixels."""
+
+	def __init__(self, samples, color=TRACE_COLOR, name='', scale_level_y=0,
+			position=(0, 0), origin=None):
+		self.samples = numpy.asarray(samples, dtype=float)
+		self.color = color
+		self.name = name
+		self.scale_level_y = scale_level_y
+		self.position = position
+		self.origin = origin
+
+
+class RasterFrame(object):
+	"""A snapshot to be drawn by the software rasterizer: a graticule of the
+	given size with traces on it, zoomed and panned horizontally together as
+	in a TraceGroup, and a row of labels along the top if labels is true."""
+
+	def __init__(self, traces, width=576, height=576, scale_level_x=0,
+			pan_x=0, labels=True):
+		self.traces = traces
+		self.width = width
+		self.height = height
+		self.scale_level_x = scale_level_x
+		self.pan_x = pan_x
+		self.labels = labels
+
+
+def _composite(image, indices, coverage, color):
+	"""Blend color into the float RGB image at the pixels with the given flat
+	indices, with the given coverage. Only those pixels are touched, which
+	for lines are a small fraction of the image."""
+	pixels = image.reshape(-1, 3)
+	alpha = (coverage * (color[3] / 255.))[:, numpy.newaxis]
+	pixels[indices] = (1 - alpha) * pixels[indices] + alpha * color[:3]
+
+
+def _composite_mask(image, mask, color, x, y):
+	"""Blend color into the float RGB image with the coverage in the 2D array
+	mask, whose top left corner is at (x, y) in the image."""
+	h, w = image.shape[:2]
+	mask = mask[:max(0, h - y), :max(0, w - x)]
+	rows, cols = numpy.nonzero(mask)
+	_composite(image, (rows + y) * w + cols + x, mask[rows, cols], color)
+
+
+def trace_segments(trace, frame):
+	"""Return the line segments of a trace in the pixel coordinates of a
+	frame, decimated as in Trace.get_envelope."""
+	n = len(trace.samples)
+	half_w = 0.5 * frame.width
+	half_h = 0.5 * frame.height
+	tx, ty = trace.position
+	sx = scale_for_level(frame.scale_level_x)
+	sy = scale_for_level(trace.scale_level_y)
+	offset = frame.pan_x + sx * tx
+	origin = n // 2 if trace.origin is None else trace.origin
+	start = max(0, origin + int(math.floor((-half_w - offset) / sx)) - 1)
+	stop = min(n, origin + int(math.ceil((half_w - offset) / sx)) + 2)
+	if start >= stop:
+		return numpy.empty((0, 4))
+	i, y = minmax_envelope(trace.samples[start:stop], start,
+		samples_per_pixel(frame.scale_level_x))
+	x = half_w + offset + sx * (i - origin)
+	y = half_h + ty - sy * y
+	return numpy.column_stack((x[:-1], y[:-1], x[1:], y[1:]))
+
+
+def render_frame(frame):
+	"""Render a RasterFrame. Return an array of shape (height, width, 4) of
+	8-bit alpha, red, green, and blue."""
+	w, h = frame.width, frame.height
+	image = numpy.empty((h, w, 3), dtype=numpy.float32)
+	image[:] = parse_color(BACKGROUND_COLOR)[:3]
+
+	lines = graticule_lines(w, h, MAJOR_PIXELS) + (0.5 * w, 0.5 * h, 0.5 * w, 0.5 * h)
+	indices, coverage = segment_coverage(lines, w, h)
+	_composite(image, indices, coverage, parse_color(GRIDLINE_COLOR))
+
+	for trace in frame.traces:
+		indices, coverage = segment_coverage(trace_segments(trace, frame), w, h)
+		_composite(image, indices, coverage, parse_color(trace.color))
+
+	if frame.labels:
+		label_w, label_h = LABEL_SIZE
+		for k, trace in enumerate(frame.traces):
+			x = k * (label_w + LABEL_SPACING)
+			if x >= w:
+				break
+			color = parse_color(trace.color)
+			_composite_mask(image, round_rectangle_mask(label_w, label_h, 5), darken(color), x, 0)
+			_composite_mask(image, round_rectangle_mask(label_w - 6, label_h - 6, 3), color, x + 3, 3)
+
+	argb = numpy.empty((h, w, 4), dtype=numpy.uint8)
+	argb[..., 0] = 255
+	argb[..., 1:] = numpy.round(image)
+	return argb
+
+
+def write_png(filename, argb):
+	"""Write an image array as returned by render_frame to a PNG file."""
+	h, w = argb.shape[:2]
+	rgba = numpy.roll(argb, -1, axis=2)
+	rows = numpy.zeros((h, 1 + 4 * w), dtype=numpy.uint8)
+	rows[:, 1:] = rgba.reshape(h, -1)
+
+	def chunk(tag, data):
+		return struct.pack('>I', len(data)) + tag + data + \
+			struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+	with open(filename, 'wb') as f:
+		f.write(b'\x89PNG\r\n\x1a\n')
+		f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0)))
+		f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+		f.write(chunk(b'IEND', b''))
+
+
+def _render_png(args):
+	frame, filename = args
+	write_png(filename, render_frame(frame))
+	return filename
+
+
+def render_batch(frames, filenames=None, processes=None):
+	"""Render many RasterFrames in parallel on a pool of processes (by
+	default, one per CPU). If filenames is given, write each frame to the
+	PNG file of the same position and return the file names; otherwise,
+	return the image arrays."""
+	pool = multiprocessing.Pool(processes)
+	try:
+		if filenames is None:
+			return pool.map(render_frame, frames)
+		else:
+			return pool.map(_render_png, zip(frames, filenames))
+	finally:
+		pool.close()
+		pool.join()
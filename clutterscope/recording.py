@@ -0,0 +1,328 @@
+"""
+ClutterScope recordings: writes live channels to disk as they are displayed,
+and reads them back for playback. A recording is a pair of append-only files.
+The data file is a sequence of compressed chunks of a fixed number of
+samples; the bytes of the samples are shuffled so that the bytes of equal
+significance are together, which helps zlib with floating-point data. The
+index file is a JSON header followed by one fixed-size record per chunk,
+with the index of its first sample, its place in the data file, and the
+minimum and maximum of each channel, so that any time range is found by a
+binary search and a zoomed-out view is drawn without decompressing anything.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import collections
+import json
+import struct
+import threading
+import zlib
+import numpy
+from clutterscope.data import BlockQueue, trace_envelope
+
+
+"""Magic number at the start of an index file"""
+INDEX_MAGIC = b'CSRIDX01'
+
+
+def index_filename(filename):
+	"""Return the name of the index file of the recording in filename."""
+	return filename + '.idx'
+
+
+def index_dtype(channels):
+	"""Return the dtype of the records of an index file for a recording of
+	the given number of channels."""
+	return numpy.dtype([
+		('start', '<i8'), ('count', '<i8'), ('offset', '<i8'), ('length', '<i8'),
+		('min', '<f8', (channels,)), ('max', '<f8', (channels,))])
+
+
+class Recorder(object):
+	"""Records blocks of samples of one or more channels that share a time
+	base to a recording. append() only copies samples into the chunk being
+	filled, on the caller's thread; full chunks are compressed and written
+	by a writer thread. At most maxsize full chunks wait to be written, and
+	when there are that many, policy decides what happens, as for a
+	BlockQueue: by default, the oldest of them is dropped, so that append()
+	never waits for the writer on the thread that draws the scope. Chunks
+	that are dropped leave gaps in the recording, and are counted by
+	dropped. Pass policy=BlockQueue.BLOCK to lose no samples instead.
+
+	Call close() to write the last, partial chunk and finish the files."""
+
+	"""Suffix of the names of data files"""
+	SUFFIX = '.csr'
+
+	"""Default number of samples per chunk"""
+	CHUNK_SAMPLES = 1 << 16
+
+	def __init__(self, filename, channels=1, sample_rate=1., epoch=0.,
+			chunk_samples=CHUNK_SAMPLES, dtype=numpy.float64, names=None,
+			level=6, maxsize=16, policy=BlockQueue.DROP_OLDEST):
+		if chunk_samples < 1:
+			raise ValueError('chunk_samples must be at least 1')
+		self.filename = filename
+		self.channels = channels
+		self.chunk_samples = int(chunk_samples)
+		self.dtype = numpy.dtype(dtype).newbyteorder('<')
+		self.level = level
+		self.queue = BlockQueue(maxsize, policy)
+		self.__record = numpy.zeros(1, dtype=index_dtype(channels))
+		self.__data_file = open(filename, 'wb')
+		self.__index_file = open(index_filename(filename), 'wb')
+		header = json.dumps(dict(version=1, channels=channels,
+			names=names or [], sample_rate=sample_rate, epoch=epoch,
+			chunk_samples=self.chunk_samples, dtype=self.dtype.str,
+			compression='shuffle+zlib')).encode('utf-8')
+		self.__index_file.write(INDEX_MAGIC + struct.pack('<I', len(header)) + header)
+		self.__index_file.flush()
+		self.__offset = 0
+		self.__chunk = None
+		self.__start = 0
+		self.__fill = 0
+		self.__thread = threading.Thread(target=self.__run)
+		self.__thread.daemon = True
+		self.__thread.start()
+
+	@property
+	def total(self):
+		"""Index after that of the last sample appended."""
+		return self.__start + self.__fill
+
+	@property
+	def dropped(self):
+		"""Number of chunks that were dropped rather than written."""
+		return self.queue.dropped
+
+	def append(self, block, start=None):
+		"""Append a block of samples, with a row per channel if there is more
+		than one. If start, the index of its first sample, is given and is not
+		the index after the last sample appended, the block begins a new
+		chunk after a gap."""
+		block = numpy.asarray(block).reshape(self.channels, -1)
+		if start is not None and start != self.total:
+			self.flush()
+			self.__start = start
+		n = block.shape[1]
+		k = 0
+		while k < n:
+			if self.__chunk is None:
+				self.__chunk = numpy.empty((self.channels, self.chunk_samples), dtype=self.dtype)
+			m = min(n - k, self.chunk_samples - self.__fill)
+			self.__chunk[:, self.__fill:self.__fill + m] = block[:, k:k + m]
+			self.__fill += m
+			k += m
+			if self.__fill == self.chunk_samples:
+				self.flush()
+
+	def flush(self):
+		"""Pass the chunk being filled, even if it is not full, to the writer
+		thread."""
+		if self.__fill:
+			self.queue.put(self.__start, self.__chunk[:, :self.__fill])
+			self.__start += self.__fill
+			self.__chunk = None
+			self.__fill = 0
+
+	def close(self):
+		"""Write any remaining samples, wait for the writer thread, and close
+		the files."""
+		self.flush()
+		self.queue.close()
+		self.__thread.join()
+		self.__data_file.close()
+		self.__index_file.close()
+
+	def __run(self):
+		while self.queue.wait():
+			for start, chunk in self.queue.drain():
+				self.__write(start, chunk)
+
+	def __write(self, start, chunk):
+		data = zlib.compress(shuffle(chunk), self.level)
+		finite = numpy.isfinite(chunk)
+		record = self.__record[0]
+		record['start'] = start
+		record['count'] = chunk.shape[1]
+		record['offset'] = self.__offset
+		record['length'] = len(data)
+		record['min'] = numpy.where(finite, chunk, numpy.inf).min(axis=1)
+		record['max'] = numpy.where(finite, chunk, -numpy.inf).max(axis=1)
+		# Write the chunk before its record, so that every record in the
+		# index refers to a chunk that is complete on disk.
+		self.__data_file.write(data)
+		self.__data_file.flush()
+		self.__index_file.write(self.__record.tobytes())
+		self.__index_file.flush()
+		self.__offset += len(data)
+
+
+def shuffle(a):
+	"""Return the bytes of an array with all of the first bytes of its
+	elements first, then all of the second bytes, and so on."""
+	a = numpy.ascontiguousarray(a)
+	return a.view(numpy.uint8).reshape(-1, a.dtype.itemsize).T.tobytes()
+
+
+def unshuffle(data, dtype):
+	"""Undo shuffle, returning a 1D array of the given dtype."""
+	dtype = numpy.dtype(dtype)
+	return numpy.frombuffer(data, dtype=numpy.uint8).reshape(dtype.itemsize, -1).T.copy().view(dtype).ravel()
+
+
+def read_index(filename):
+	"""Return the header and the array of chunk records of the recording in
+	filename. A record that is only partly written, as while the recording
+	is still going on, is ignored."""
+	with open(index_filename(filename), 'rb') as f:
+		magic = f.read(len(INDEX_MAGIC))
+		if magic != INDEX_MAGIC:
+			raise ValueError('%s is not a recording index' % index_filename(filename))
+		length, = struct.unpack('<I', f.read(4))
+		header = json.loads(f.read(length).decode('utf-8'))
+		dtype = index_dtype(header['channels'])
+		data = f.read()
+	n = len(data) // dtype.itemsize
+	return header, numpy.frombuffer(data[:n * dtype.itemsize], dtype=dtype)
+
+
+class RecordedChannel(object):
+	"""Read-only channel of a recording. It provides the same interface for
+	reading as a RingBuffer, so it can stand in for the buffer of a Trace,
+	and, like a MappedChannel, its capacity is the span of the samples.
+	Chunks are decompressed when their samples are first read, and the most
+	recently read CACHE_CHUNKS of them are kept. Call refresh() to see the
+	chunks that have been written since the recording was opened."""
+
+	"""Number of decompressed chunks to keep"""
+	CACHE_CHUNKS = 64
+
+	"""Samples are one-dimensional, as in a RingBuffer without channels"""
+	channels = None
+
+	def __init__(self, filename, channel=0):
+		self.filename = filename
+		self.channel = channel
+		self.__file = open(filename, 'rb')
+		self.__cache = collections.OrderedDict()
+		self.refresh()
+		if not 0 <= channel < self.header['channels']:
+			raise ValueError('channel must be in the range [0, channels)')
+		self.sample_rate = self.header['sample_rate']
+		self.epoch = self.header['epoch']
+		self.summary = ChunkSummary(self)
+
+	def refresh(self):
+		"""Read the index again."""
+		self.header, self.records = read_index(self.filename)
+		self.__starts = self.records['start']
+		self.__stops = self.records['start'] + self.records['count']
+
+	def __len__(self):
+		if not len(self.records):
+			return 0
+		return int(self.__stops[-1] - self.__starts[0])
+
+	@property
+	def total(self):
+		if not len(self.records):
+			return 0
+		return int(self.__stops[-1])
+
+	@property
+	def capacity(self):
+		return len(self)
+
+	@property
+	def dtype(self):
+		return numpy.dtype(self.header['dtype'])
+
+	def chunks(self, start, stop):
+		"""Return the half-open range [lo, hi) of positions of the chunks that
+		hold samples with indices in the half-open range [start, stop)."""
+		lo = numpy.searchsorted(self.__stops, start, side='right')
+		hi = numpy.searchsorted(self.__starts, stop, side='left')
+		return int(lo), int(max(lo, hi))
+
+	def chunk(self, k):
+		"""Return the samples of this channel in chunk k."""
+		try:
+			y = self.__cache.pop(k)
+		except KeyError:
+			record = self.records[k]
+			self.__file.seek(record['offset'])
+			data = zlib.decompress(self.__file.read(record['length']))
+			y = unshuffle(data, self.dtype).reshape(-1, record['count'])[self.channel]
+			if len(self.__cache) >= self.CACHE_CHUNKS:
+				self.__cache.popitem(last=False)
+		self.__cache[k] = y
+		return y
+
+	def regions(self):
+		return tuple(self.chunk(k) for k in range(len(self.records)))
+
+	def window(self, start, stop):
+		result = []
+		for k in range(*self.chunks(start, stop)):
+			i0 = int(self.__starts[k])
+			lo = max(start, i0)
+			hi = min(stop, int(self.__stops[k]))
+			result.append((lo, self.chunk(k)[lo - i0:hi - i0]))
+		return result
+
+	def take(self, indices):
+		"""Return the samples with the given indices, with NaN for indices
+		that are not in the recording."""
+		indices = numpy.asarray(indices)
+		result = numpy.full(indices.shape, numpy.nan)
+		k = numpy.searchsorted(self.__stops, indices, side='right')
+		valid = (k < len(self.records))
+		valid[valid] &= indices[valid] >= self.__starts[k[valid]]
+		for j in numpy.unique(k[valid]):
+			mask = valid & (k == j)
+			result[mask] = self.chunk(j)[indices[mask] - self.__starts[j]]
+		return result
+
+
+class ChunkSummary(object):
+	"""Stands in for the MinMaxPyramid of a Trace that plays back a
+	RecordedChannel. When a bucket spans at least a chunk, the envelope is
+	drawn from the minimum and maximum that the index records for each
+	chunk, without decompressing any samples; otherwise it is computed from
+	the samples."""
+
+	def __init__(self, channel):
+		self.buffer = channel
+
+	@property
+	def depth(self):
+		return int(self.buffer.header['chunk_samples']).bit_length() - 1
+
+	def level(self, bucket):
+		"""Return the number of times that samples are halved in the
+		envelope at the given bucket size, as MinMaxPyramid.level does."""
+		return self.depth if bucket >= self.buffer.header['chunk_samples'] else 0
+
+	def envelope(self, start, stop, bucket):
+		"""Return the envelope of the samples with indices in the half-open
+		range [start, stop), as MinMaxPyramid.envelope does. Each chunk
+		contributes a vertex at its minimum and one at its maximum at its
+		center, and the pen is lifted across gaps between chunks."""
+		if bucket < self.buffer.header['chunk_samples']:
+			return trace_envelope(self.buffer, None, start, stop, bucket)
+		lo, hi = self.buffer.chunks(start, stop)
+		records = self.buffer.records[lo:hi]
+		channel = self.buffer.channel
+		x = records['start'] + 0.5 * (records['count'] - 1)
+		y = numpy.column_stack((records['min'][:, channel], records['max'][:, channel]))
+		y[~numpy.isfinite(y)] = numpy.nan
+		# Lift the pen between chunks that are not contiguous.
+		gap = records['start'][1:] != records['start'][:-1] + records['count'][:-1]
+		sep = numpy.where(numpy.append(gap, False), numpy.nan, y[:, 1])
+		keep = numpy.ones((len(records), 3), dtype=bool)
+		keep[:, 2] = numpy.append(gap, False)
+		x = numpy.repeat(x, 3).reshape(-1, 3)
+		y = numpy.column_stack((y, sep))
+		return x[keep], y[keep]
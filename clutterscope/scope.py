@@ -0,0 +1,1591 @@
+"""
+ClutterScope - Clutter-based software digitial storage oscilloscope
+Copyright (C) 2011  Leo Singer
+
+The user interface: Clutter actors for the graticule, traces, and labels,
+and the trace renderers. Importing this module imports Clutter and Cogl.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+# TODO: Add fade-in effect for graticule
+# TODO: Add labels for traces showing name, color, scale, etc.
+# TODO: Dragging to change trace offset should snap to horizontal or vertical
+
+
+import itertools
+import math
+import sys
+import timeit
+import numpy
+from gi.repository import GLib, GObject, Clutter, Cogl
+from clutterscope.data import (MAJOR_PIXELS, BACKGROUND_COLOR,
+	GRIDLINE_COLOR, TRACE_COLOR, LABEL_SIZE, LABEL_SPACING, graticule_lines,
+	finite_runs, polyline_coords, scale_for_level, samples_per_pixel,
+	MIN_BUCKET, minmax_envelope, trace_envelope, RingBuffer, MappedChannel,
+	SegmentedChannel, MinMaxPyramid, Resampler, SEGMENT_VERTEX,
+	segment_vertices, Phosphor, log_spectrum_envelope, MathChannel,
+	frame_stats, QualityGovernor, BlockQueue, Acquisition)
+from clutterscope.recording import Recorder, RecordedChannel
+
+
+def path_polyline(x, y):
+	"""Add a polyline through the points (x, -y) to the current path."""
+	Cogl.path_polyline(polyline_coords(x, y), len(x))
+
+
+def color_from_string(str):
+	"""Return a new instance of Clutter.Color initialized with a string."""
+	color = Clutter.Color()
+	if not color.from_string(str):
+		raise RuntimeError
+	return color
+
+
+def cogl_color_from_clutter_color(c):
+	"""Return a Cogl.Color that is equivalent to a Clutter.Color."""
+	cogl_color = Cogl.Color()
+	cogl_color.init_from_4ub(c.red, c.green, c.blue, c.alpha)
+	return cogl_color
+
+
+"""Serial numbers that tell apart actors in frame_stats"""
+_stats_serials = itertools.count(1)
+
+
+def stats_name(actor):
+	"""Return the name under which the paint cost of actor is recorded in
+	frame_stats: a serial number, unique to the actor, followed by its name,
+	or its type if it has no name."""
+	try:
+		serial = actor.stats_serial
+	except AttributeError:
+		serial = actor.stats_serial = next(_stats_serials)
+	return '#%d %s' % (serial, actor.get_name() or type(actor).__name__)
+
+
+class animate(object):
+	"""Replacement for implicit animation functions, which don't yet work with
+	gobject-introspection."""
+	def __init__(self):
+		self.__objs = {}
+
+	def __destroy(self, actor, user_data):
+		del self.__objs[actor]
+
+	def __call__(self, actor, mode, duration, **kwargs):
+		try:
+			animations = self.__objs[actor]
+		except KeyError:
+			animations = {}
+			self.__objs[actor] = animations
+			actor.connect('destroy', self.__destroy)
+
+		for key, value in kwargs.items():
+			key = key.replace('_', '-')
+
+			try:
+				animation = animations[key]
+				animation.unbind_property(key)
+			except KeyError:
+				animation = Clutter.Animation()
+				animation.set_object(actor)
+				animations[key] = animation
+			animation.set_duration(duration)
+			animation.bind(key, value)
+			animation.get_timeline().start()
+animate = animate()
+
+
+class ClutterScope(Clutter.Group):
+	"""A Clutter-powered digital storage oscilloscope."""
+
+	"""Change in scale level per scroll step (one click of a wheel, or one
+	unit of smooth scrolling)"""
+	SCROLL_STEP = 1.
+
+	"""Fraction of the visible window by which the envelopes computed by a
+	pool extend beyond it on either side"""
+	ENVELOPE_MARGIN = 0.25
+
+	def __init__(self, renderer='path', queue_size=64, backpressure=BlockQueue.DROP_OLDEST):
+		super(ClutterScope, self).__init__()
+		self.graticule = Graticule()
+		self.add_actor(self.graticule)
+		#self.set_reactive(True)
+
+		self.traces = []
+		self.governor = None
+
+		layout = Clutter.BoxLayout()
+		layout.set_vertical(False)
+		layout.set_use_animations(True)
+		layout.set_easing_duration(100)
+		layout.set_spacing(LABEL_SPACING)
+		self.label_box = Clutter.Box()
+		self.label_box.set_layout_manager(layout)
+		self.add_actor(self.label_box)
+		self.label_box.set_position(0, 0)
+		constraint = Clutter.BindConstraint()
+		constraint.set_coordinate(Clutter.BindCoordinate.WIDTH)
+		self.label_box.add_constraint(constraint)
+
+		# Add some traces (just for looks)
+		demo_data = 20 * numpy.sin(numpy.arange(-400, 400) * 0.1)
+
+		tr = Trace(renderer=renderer)
+		tr.set_position(0, -50)
+		self.add_trace(tr)
+		tr.set_name('H1:DMT-STRAIN')
+		tr.append_data(demo_data)
+
+		tr = Trace(renderer=renderer)
+		tr.set_color(color_from_string('magenta'))
+		self.add_trace(tr)
+		tr.set_name('L1:DMT-STRAIN')
+		tr.append_data(demo_data)
+
+		tr = Trace(renderer=renderer)
+		tr.set_color(color_from_string('yellow'))
+		tr.set_position(0, 50)
+		self.add_trace(tr)
+		tr.set_name('A1:DMT-STRAIN')
+		tr.append_data(demo_data)
+
+		# State for event signal handlers
+		self.selected_trace = self.traces[0]
+		self.__drag_origin = None
+
+		# Input: scroll and drag events only accumulate, and are applied once
+		# per frame by the input timeline, which runs while there is input.
+		self.__scroll_delta = [0., 0.]
+		self.__pointer = None
+		self.__input_timeline = Clutter.Timeline()
+		self.__input_timeline.set_duration(1000)
+		self.__input_timeline.set_loop(True)
+		self.__input_timeline.connect('new-frame', self.apply_input)
+
+		# Triggering
+		self.trigger = None
+		self.__trigger_source = None
+		self.__trigger_handler = None
+
+		# Acquisition; queued blocks are drained once per frame.
+		self.acquisition = Acquisition(queue_size, backpressure)
+		self.__timeline = Clutter.Timeline()
+		self.__timeline.set_duration(1000)
+		self.__timeline.set_loop(True)
+		self.__timeline.connect('new-frame', self.new_frame)
+		self.connect('destroy', lambda *args: self.acquisition.stop(0))
+
+		# Parallel processing
+		self.pool = None
+		self.__pending = None
+
+		# Recording, by trace
+		self.recorders = {}
+		self.connect('destroy', lambda *args: self.stop_recording())
+
+		# Frame statistics and quality governor
+		self.stats_overlay = None
+		self.__paint_start = None
+		self.connect('paint', self.paint_begin)
+		self.connect_after('paint', self.paint_end)
+
+	def paint_begin(self, actor):
+		"""paint signal handler, run before the children are painted."""
+		frame_stats.begin_frame()
+		self.__paint_start = timeit.default_timer()
+
+	def paint_end(self, actor):
+		"""paint signal handler, run after the children are painted."""
+		frame_stats.end_frame(len(self.acquisition.queue))
+		if self.governor is not None and self.__paint_start is not None:
+			if self.governor.update(timeit.default_timer() - self.__paint_start):
+				self.apply_quality()
+
+	def set_governor(self, governor):
+		"""Hold a frame rate by lowering and raising the quality of drawing
+		as governor, a QualityGovernor, decides from the paint time of each
+		frame. Its state and decisions can be read from the governor
+		attribute. Pass None to always draw at full quality."""
+		self.governor = governor
+		self.apply_quality()
+
+	def apply_quality(self):
+		"""Apply the governor's current quality level to the traces, the
+		graticule, and the labels."""
+		governor = self.governor or QualityGovernor()
+		for trace in self.traces:
+			trace.set_coarsening(governor.vertex_scale)
+		self.graticule.set_tick_detail(governor.tick_detail)
+		for label in self.label_box.get_children():
+			label.paused = not governor.label_refresh
+
+	def set_show_stats(self, show):
+		"""Show or hide the frame statistics overlay. Statistics are recorded
+		while it is shown, and are available from frame_stats."""
+		if show and self.stats_overlay is None:
+			self.stats_overlay = StatsOverlay()
+			self.add_actor(self.stats_overlay)
+			self.stats_overlay.set_position(4, 56)
+		if self.stats_overlay is not None:
+			if show:
+				self.stats_overlay.show()
+			else:
+				self.stats_overlay.hide()
+
+	def add_source(self, trace, read):
+		"""Feed trace with blocks read by the callable read on a producer
+		thread; see Acquisition."""
+		self.acquisition.add_source(trace, read)
+		if not self.__timeline.is_playing():
+			self.__timeline.start()
+
+	def set_pool(self, pool):
+		"""Compute the envelopes of the traces whose buffers are
+		SharedRingBuffers, such as those returned by pool.buffer(), in the
+		worker processes of pool, a ChannelPool. The workers run while the
+		frame is painted, and their envelopes are drawn from the next frame,
+		so those traces lag by a frame. Each envelope extends ENVELOPE_MARGIN
+		beyond the window on either side, so it is still drawn after the
+		window has moved a little; a trace whose window has moved further,
+		or whose bucket size has changed, is computed while painting until
+		the next envelope arrives. Pass None to compute them while painting,
+		as for other traces."""
+		self.pool = pool
+		self.__pending = None
+		if pool is None:
+			for trace in self.traces:
+				trace.set_envelope(None)
+		if pool is not None and not self.__timeline.is_playing():
+			self.__timeline.start()
+
+	def new_frame(self, timeline, msecs):
+		"""Acquisition timeline's new-frame signal handler."""
+		if self.__pending is not None:
+			result, traces, jobs = self.__pending
+			# Appending to the shared buffers would overwrite samples that
+			# the workers may be reading, so wait for them before draining.
+			if not result.ready():
+				return
+			self.__pending = None
+			if result.successful():
+				for trace, job, envelope in zip(traces, jobs, result.get()):
+					trace.set_envelope(envelope, *job[1:])
+		self.acquisition.drain()
+		if self.pool is not None:
+			self.__dispatch_envelopes()
+
+	def __dispatch_envelopes(self):
+		# clutterscope.parallel needs multiprocessing.shared_memory, so it is
+		# only imported once a pool is in use.
+		from clutterscope.parallel import channel_envelope
+		traces = [trace for trace in self.traces
+			if hasattr(trace.buffer, 'handle') and trace.resampler is None]
+		jobs = []
+		for trace in traces:
+			# Ask for a margin on either side, so that the envelope still
+			# covers the window after it has rolled or been panned by the
+			# time the envelope arrives.
+			start, stop = trace.get_visible_range()
+			margin = int((stop - start) * self.ENVELOPE_MARGIN)
+			jobs.append((trace.buffer, start - margin, stop + margin, trace.get_bucket()))
+		if jobs:
+			result = self.pool.map_async(channel_envelope, jobs)
+			self.__pending = (result, traces, jobs)
+
+	def add_trace(self, trace):
+		"""Add a trace to the graticule, with a label."""
+		self.graticule.trace_group.add_actor(trace)
+		self.traces += [trace]
+		self.label_box.add_actor(TraceLabel(trace))
+		if self.governor is not None:
+			self.apply_quality()
+
+	def add_math_trace(self, expression, name=None, **kwargs):
+		"""Add a trace derived from the traces already added by an
+		arithmetic expression over their names, such as
+		'H1:DMT-STRAIN - L1:DMT-STRAIN'. Keyword arguments are passed to
+		MathTrace. Return the trace. Traces without names, and collections,
+		cannot be inputs."""
+		inputs = dict((trace.get_name(), trace) for trace in self.traces
+			if trace.get_name() and trace.buffer.channels is None)
+		tr = MathTrace(expression, inputs, **kwargs)
+		self.add_trace(tr)
+		if name is not None:
+			tr.set_name(name)
+		return tr
+
+	def open_recording(self, filename, name=None, **kwargs):
+		"""Add a trace that plays back a recorded channel from a file. Files
+		that end with Recorder.SUFFIX were written by a Recorder, and are read
+		by a RecordedChannel; others are read by a MappedChannel. Keyword
+		arguments are passed to either one. Return the trace."""
+		if filename.endswith(Recorder.SUFFIX):
+			tr = Trace(buffer=RecordedChannel(filename, **kwargs))
+			tr.pyramid = tr.buffer.summary
+		else:
+			tr = Trace(buffer=MappedChannel(filename, **kwargs))
+		self.add_trace(tr)
+		tr.set_name(name or filename)
+		return tr
+
+	def start_recording(self, prefix, **kwargs):
+		"""Record the samples appended to each trace from now on to a file
+		named prefix, then its index among the traces, then Recorder.SUFFIX.
+		Keyword arguments are passed to Recorder. Unless they say otherwise,
+		samples are recorded with the dtype of the trace's buffer, in chunks
+		of Recorder.CHUNK_SAMPLES or of the capacity of the buffer, whichever
+		is smaller, so that a chunk is written at least once per buffer.
+
+		A TraceCollection is recorded with a row for each of the channels that
+		it has now, under their names; a channel removed while recording reads
+		as NaN for the rest of the file, and a channel added is not recorded.
+		A collection with no channels is not recorded at all.
+
+		The recorder of each trace is its recorder attribute while it is
+		recording, and the number of chunks that it has dropped is shown in
+		the trace's label."""
+		self.stop_recording()
+		for k, trace in enumerate(self.traces):
+			if trace.buffer.channels is None:
+				names = None
+				name = trace.get_name()
+			else:
+				names = list(trace.channel_names)
+				if not names:
+					continue
+			options = dict(dtype=trace.buffer.dtype,
+				chunk_samples=max(1, min(Recorder.CHUNK_SAMPLES, trace.buffer.capacity)))
+			options.update(kwargs)
+			recorder = Recorder('%s%d%s' % (prefix, k, Recorder.SUFFIX),
+				channels=1 if names is None else len(names),
+				names=names if names is not None else [name] if name else None,
+				**options)
+			handler = trace.connect('data-appended', self.record_appended)
+			self.recorders[trace] = (recorder, handler, names)
+			trace.recorder = recorder
+
+	def stop_recording(self):
+		"""Stop recording, and finish writing the files."""
+		for trace, (recorder, handler, names) in self.recorders.items():
+			trace.disconnect(handler)
+			trace.recorder = None
+			recorder.close()
+		self.recorders = {}
+
+	def record_appended(self, trace, start, stop):
+		"""Recorded trace's data-appended signal handler."""
+		recorder, handler, names = self.recorders[trace]
+		if names is not None:
+			rows = [trace.channel_names.index(name) if name in trace.channel_names
+				else None for name in names]
+		for i0, y in trace.buffer.window(start, stop):
+			if names is not None:
+				block = numpy.full((len(names), y.shape[-1]), numpy.nan, dtype=y.dtype)
+				for k, row in enumerate(rows):
+					if row is not None:
+						block[k] = y[row]
+				y = block
+			recorder.append(y, i0)
+
+	def set_renderer(self, name):
+		"""Select how all of the traces are drawn; see TRACE_RENDERERS."""
+		for trace in self.traces:
+			trace.set_renderer(name)
+
+	def set_trigger(self, trigger, source=None):
+		"""Lock the display to events that trigger finds in the data appended
+		to source (by default, the selected trace). The most recent event is
+		placed at the center of the graticule. Pass None for trigger to
+		return to free-running display."""
+		if self.__trigger_handler is not None:
+			self.__trigger_source.disconnect(self.__trigger_handler)
+			self.__trigger_source = self.__trigger_handler = None
+		self.trigger = trigger
+		if trigger is None:
+			for trace in self.traces:
+				trace.set_trigger_index(None)
+		else:
+			if source is None:
+				source = self.selected_trace
+			trigger.reset()
+			self.__trigger_source = source
+			self.__trigger_handler = source.connect('data-appended', self.data_appended)
+
+	def data_appended(self, trace, start, stop):
+		"""Trigger source's data-appended signal handler."""
+		events = []
+		for i0, y in trace.buffer.window(start, stop):
+			events.extend(self.trigger.process(y, i0).tolist())
+		if events:
+			for tr in self.traces:
+				tr.set_trigger_events(events)
+
+	def queue_input(self):
+		"""Arrange for accumulated input to be applied on the next frame."""
+		if not self.__input_timeline.is_playing():
+			self.__input_timeline.start()
+
+	def apply_input(self, timeline, msecs):
+		"""Input timeline's new-frame signal handler. Apply the scrolling and
+		dragging accumulated since the last frame, all at once."""
+		dx, dy = self.__scroll_delta
+		self.__scroll_delta = [0., 0.]
+		if dx:
+			group = self.graticule.trace_group
+			group.set_scale_level_x(group.get_scale_level_x() + dx)
+		if dy:
+			self.selected_trace.set_scale_level_y(self.selected_trace.get_scale_level_y() + dy)
+		self.__apply_drag()
+		timeline.stop()
+
+	def __apply_drag(self):
+		"""Move the traces to the last pointer position of a drag, if it has
+		not been applied yet."""
+		if self.__drag_origin and self.__pointer:
+			actor_origin, event_origin = self.__drag_origin
+			x, y = self.__pointer
+			# Pan all of the traces horizontally, and the selected trace
+			# vertically.
+			self.graticule.trace_group.set_x(actor_origin[0] + x - event_origin[0])
+			self.selected_trace.set_y(actor_origin[1] + y - event_origin[1])
+		self.__pointer = None
+
+	def do_scroll_event(self, event):
+		direction = event.direction
+		if direction == Clutter.ScrollDirection.UP:
+			self.__scroll_delta[1] += self.SCROLL_STEP
+		elif direction == Clutter.ScrollDirection.DOWN:
+			self.__scroll_delta[1] -= self.SCROLL_STEP
+		elif direction == Clutter.ScrollDirection.LEFT:
+			self.__scroll_delta[0] += self.SCROLL_STEP
+		elif direction == Clutter.ScrollDirection.RIGHT:
+			self.__scroll_delta[0] -= self.SCROLL_STEP
+		elif direction == getattr(Clutter.ScrollDirection, 'SMOOTH', None):
+			# Smooth scrolling (Clutter >= 1.10) reports fractional steps,
+			# positive down and to the right.
+			dx, dy = event.get_scroll_delta()
+			self.__scroll_delta[0] -= self.SCROLL_STEP * dx
+			self.__scroll_delta[1] -= self.SCROLL_STEP * dy
+		else:
+			return
+		self.queue_input()
+
+	def do_motion_event(self, event):
+		if self.__drag_origin:
+			self.__pointer = (event.x, event.y)
+			self.queue_input()
+
+	def do_button_press_event(self, event):
+		if event.button == 1:
+			actor_origin = (self.graticule.trace_group.get_x(), self.selected_trace.get_y())
+			self.__drag_origin = (actor_origin, (event.x, event.y))
+
+	def do_button_release_event(self, event):
+		if event.button == 1:
+			self.__pointer = (event.x, event.y)
+			self.__apply_drag()
+			self.__drag_origin = None
+
+
+class GroupNoLayout(Clutter.Group):
+	"""A Group that ignores its layout manager, so its size is not affected by
+	the allocations of its children."""
+
+	def __init__(self):
+		super(GroupNoLayout, self).__init__()
+
+	def do_get_preferred_width(self, width):
+		return (0., width)
+
+	def do_get_preferred_height(self, height):
+		return (0., height)
+
+
+class Graticule(GroupNoLayout):
+	"""Actor that provides grid and axes for a ClutterScope.
+	This actor paints into an area that extends from half its width above its
+	top to half its width above its bottom, so that it is possible to conveniently
+	parent objects to it and have their coordinates referenced from (0, 0) refer
+	to the center of the stage."""
+
+	"""Pixels between major gridlines"""
+	MAJOR_PIXELS = MAJOR_PIXELS
+
+	"""Background color"""
+	BACKGROUND_COLOR = color_from_string(BACKGROUND_COLOR)
+
+	"""Gridline color"""
+	GRIDLINE_COLOR = color_from_string(GRIDLINE_COLOR)
+
+	def __init__(self):
+		super(Graticule, self).__init__()
+		self.__constraints = []
+
+		constraint = Clutter.AlignConstraint()
+		constraint.set_factor(0.5)
+		constraint.set_align_axis(Clutter.AlignAxis.X_AXIS)
+		self.__constraints += [constraint]
+
+		constraint = Clutter.AlignConstraint()
+		constraint.set_align_axis(Clutter.AlignAxis.Y_AXIS)
+		constraint.set_factor(0.5)
+		self.__constraints += [constraint]
+
+		constraint = Clutter.BindConstraint()
+		constraint.set_coordinate(Clutter.BindCoordinate.SIZE)
+		self.__constraints += [constraint]
+
+		for constraint in self.__constraints:
+			self.add_constraint(constraint)
+
+		self.__path = None
+		self.__path_key = None
+		self.connect('paint', self.paint)
+
+		self.trace_group = TraceGroup()
+		self.add_actor(self.trace_group)
+		self.tick_detail = True
+
+	@staticmethod
+	def paint(self):
+		"""paint signal handler."""
+		t0 = timeit.default_timer()
+		w, h = self.get_size()
+		half_w = 0.5 * w
+		half_h = 0.5 * h
+
+		# Fill background.
+		Cogl.set_source_color(cogl_color_from_clutter_color(self.BACKGROUND_COLOR))
+		Cogl.rectangle(-half_w, -half_h, half_w, half_h)
+
+		# Build the path for the gridlines only when the size or spacing has
+		# changed; otherwise, reuse the path from the last time.
+		key = (w, h, self.MAJOR_PIXELS, self.tick_detail)
+		if key != self.__path_key:
+			for x1, y1, x2, y2 in graticule_lines(w, h, self.MAJOR_PIXELS, self.tick_detail).tolist():
+				Cogl.path_line(x1, y1, x2, y2)
+			# get_path does not give us a reference, and stroking frees the
+			# current path, so keep a copy of our own.
+			self.__path = Cogl.get_path().copy()
+			self.__path_key = key
+		else:
+			Cogl.set_path(self.__path)
+
+		# Stroke gridlines.
+		Cogl.set_source_color(cogl_color_from_clutter_color(self.GRIDLINE_COLOR))
+		Cogl.path_stroke()
+		frame_stats.record('Graticule', timeit.default_timer() - t0)
+
+	def set_tick_detail(self, detail):
+		"""Draw the short ticks at each tenth of a division if detail is
+		true, or leave them out to save time."""
+		if detail != self.tick_detail:
+			self.tick_detail = detail
+			self.queue_redraw()
+
+	def do_parent_set(self, old_parent):
+		parent = self.get_parent()
+		for constraint in self.__constraints:
+			constraint.set_source(parent)
+
+
+class TraceGroup(GroupNoLayout):
+	"""Container for the traces on a Graticule, bound to the same size. The
+	x axis is zoomed and panned by scaling and moving the whole group, with
+	a single animation however many traces it holds; the traces in it draw
+	at its x scale level."""
+
+	__gproperties__ = {
+		'scale-level-x': (
+			GObject.TYPE_DOUBLE,
+			'scale-level-x',
+			'Scale level, x-axis',
+			-GLib.MAXDOUBLE, GLib.MAXDOUBLE, 0,
+			GObject.ParamFlags.READWRITE
+		)
+	}
+
+	def __init__(self):
+		super(TraceGroup, self).__init__()
+		self.scale_level_x = 0
+		self.__constraint = Clutter.BindConstraint()
+		self.__constraint.set_coordinate(Clutter.BindCoordinate.SIZE)
+		self.add_constraint(self.__constraint)
+
+	def do_set_property(self, prop, val):
+		if prop.name == 'scale-level-x':
+			self.scale_level_x = val
+			animate(self, Clutter.AnimationMode.LINEAR, 250, scale_x = scale_for_level(val))
+
+	def do_get_property(self, prop):
+		if prop.name == 'scale-level-x':
+			return self.scale_level_x
+
+	def set_scale_level_x(self, val):
+		self.set_property('scale-level-x', val)
+
+	def get_scale_level_x(self):
+		return self.get_property('scale-level-x')
+
+	def do_parent_set(self, old_parent):
+		self.__constraint.set_source(self.get_parent())
+
+
+class Trace(Clutter.Actor):
+
+	__gsignals__ = {
+		'data-appended': (
+			GObject.SignalFlags.RUN_LAST,
+			GObject.TYPE_NONE,
+			(GObject.TYPE_INT64, GObject.TYPE_INT64)
+		)
+	}
+
+	__gproperties__ = {
+		'color': (
+			Clutter.Color,
+			'color',
+			'Trace stroke color',
+			GObject.ParamFlags.READWRITE
+		),
+		'scale-level-x': (
+			GObject.TYPE_DOUBLE,
+			'scale-level-x',
+			'Scale level, x-axis',
+			-GLib.MAXDOUBLE, GLib.MAXDOUBLE, 0,
+			GObject.ParamFlags.READWRITE
+		),
+		'scale-level-y': (
+			GObject.TYPE_DOUBLE,
+			'scale-level-y',
+			'Scale level, y-axis',
+			-GLib.MAXDOUBLE, GLib.MAXDOUBLE, 0,
+			GObject.ParamFlags.READWRITE
+		)
+	}
+
+	"""Default number of samples retained by a trace"""
+	DEFAULT_CAPACITY = 800
+
+	def __init__(self, capacity=DEFAULT_CAPACITY, renderer='path', buffer=None):
+		super(Trace, self).__init__()
+		self.set_anchor_point_from_gravity(Clutter.Gravity.CENTER)
+		self.color = color_from_string(TRACE_COLOR)
+		self.__scale_level_x = 0
+		self.scale_level_y = 0
+		if buffer is None:
+			self.buffer = RingBuffer(capacity)
+			self.pyramid = MinMaxPyramid(self.buffer)
+		else:
+			# A buffer that was filled elsewhere, such as a MappedChannel, is
+			# read as is, without a pyramid.
+			self.buffer = buffer
+			self.pyramid = None
+		self.trigger_index = None
+		self.spectrum = None
+		self.resampler = None
+		self.measurements = None
+		self.recorder = None
+		self.coarsening = 1
+		self.__envelope = None
+		self.set_renderer(renderer)
+
+	def do_set_property(self, prop, val):
+		if prop.name == 'color':
+			old_color = self.color
+			self.color = val
+			if old_color != self.color:
+				self.queue_redraw()
+		elif prop.name == 'scale-level-x':
+			# The x scale is not animated here: traces in a TraceGroup zoom
+			# together with the group.
+			self.__scale_level_x = val
+			self.queue_redraw()
+		elif prop.name == 'scale-level-y':
+			self.scale_level_y = val
+			animate(self, Clutter.AnimationMode.LINEAR, 250, scale_y = scale_for_level(val))
+
+	def do_get_property(self, prop):
+		if prop.name == 'color':
+			return self.color
+		elif prop.name == 'scale-level-x':
+			return self.scale_level_x
+		elif prop.name == 'scale-level-y':
+			return self.scale_level_y
+
+	def set_color(self, val):
+		self.set_property('color', val)
+
+	def get_color(self):
+		return self.get_property()
+
+	def set_scale_level_x(self, val):
+		self.set_property('scale-level-x', val)
+
+	def get_scale_level_x(self):
+		return self.get_property('scale-level-x')
+
+	def set_scale_level_y(self, val):
+		self.set_property('scale-level-y', val)
+
+	@property
+	def scale_level_x(self):
+		"""The x scale level, which is that of the TraceGroup that holds the
+		trace, if any."""
+		parent = self.get_parent()
+		if isinstance(parent, TraceGroup):
+			return parent.scale_level_x
+		return self.__scale_level_x
+
+	def get_graticule_transform(self):
+		"""Return the translation and scale (tx, ty, sx, sy) that take the
+		coordinates of the trace to those of the graticule, through the
+		TraceGroup that holds the trace, if any."""
+		tx, ty = self.get_position()
+		sx, sy = self.get_scale()
+		parent = self.get_parent()
+		if isinstance(parent, TraceGroup):
+			gx, gy = parent.get_position()
+			gsx, gsy = parent.get_scale()
+			tx, ty = gx + gsx * tx, gy + gsy * ty
+			sx, sy = gsx * sx, gsy * sy
+		return tx, ty, sx, sy
+
+	def get_scale_level_y(self):
+		return self.get_property('scale-level-y')
+
+	def set_renderer(self, name):
+		"""Select how the trace is drawn; see TRACE_RENDERERS."""
+		try:
+			renderer_class = TRACE_RENDERERS[name]
+		except KeyError:
+			raise ValueError('unknown trace renderer: %r' % (name,))
+		self.renderer = renderer_class()
+		self.queue_redraw()
+
+	def set_spectrum(self, spectrum):
+		"""Show the power spectral density of the samples as they arrive,
+		estimated by spectrum (a Welch instance), instead of the samples
+		themselves. Pass None to go back to showing the samples."""
+		self.spectrum = spectrum
+		self.set_renderer('path' if spectrum is None else 'spectrum')
+
+	def set_measurements(self, measurements):
+		"""Measure the samples as they arrive with measurements (a
+		Measurements instance), whose results are shown in the trace's label.
+		Pass None to stop measuring."""
+		self.measurements = measurements
+
+	def append_data(self, block, start_time=None):
+		"""Append a block of samples to the trace. This may be called as often
+		as new samples arrive; a redraw is queued only if the block is not
+		empty. If start_time is given, the buffer must be a SegmentedChannel,
+		and the block starts at that time, after a gap if there is one."""
+		block = numpy.ravel(block)
+		if len(block):
+			start = self.buffer.total
+			if start_time is None:
+				self.buffer.append(block)
+			else:
+				self.buffer.append(block, start_time)
+			if self.pyramid is not None:
+				self.pyramid.update(start, self.buffer.total)
+			if self.spectrum is not None:
+				self.spectrum.process(block)
+			if self.measurements is not None:
+				self.measurements.process(block)
+			appended = getattr(self.renderer, 'appended', None)
+			if appended is not None:
+				appended(self)
+			self.queue_redraw()
+			self.emit('data-appended', start, self.buffer.total)
+
+	def append_block(self, start, block):
+		"""Append a block of samples, the first of which has the index start
+		in its stream, after a gap if samples have been lost since the last
+		block, as when an Acquisition drops blocks."""
+		gap = start - self.buffer.total
+		if gap > 0 and isinstance(self.buffer, SegmentedChannel):
+			self.append_data(block, float(self.buffer.times(start)))
+			return
+		if gap > 0:
+			self.skip_data(gap)
+		self.append_data(block)
+
+	def skip_data(self, n):
+		"""Leave a gap of n missing samples, which lifts the pen."""
+		if n > 0:
+			start = self.buffer.total
+			self.buffer.advance(n)
+			if self.pyramid is not None:
+				self.pyramid.update(start, self.buffer.total)
+			self.queue_redraw()
+			self.emit('data-appended', start, self.buffer.total)
+
+	def set_resampling(self, resampling):
+		"""When zoomed out, show the samples low-pass filtered and decimated
+		by a Resampler if resampling is true, or as min/max envelopes if it is
+		false (the default)."""
+		if resampling and self.resampler is None:
+			self.resampler = Resampler(self.buffer)
+		elif not resampling:
+			self.resampler = None
+		self.queue_redraw()
+
+	def clear_data(self):
+		"""Discard all samples."""
+		if len(self.buffer):
+			self.buffer.clear()
+			if self.resampler is not None:
+				self.resampler.reset()
+			self.queue_redraw()
+
+	def set_trigger_index(self, index):
+		"""Lock the trace so that the sample with the given index is drawn at
+		x = 0, or pass None to let the trace roll with incoming data."""
+		if index != self.trigger_index:
+			self.__retrigger([] if index is None else [index])
+
+	def set_trigger_events(self, events):
+		"""Lock the trace to the last of events, a list of the indices of
+		trigger events in the order that they were found. Only a renderer
+		that keeps a history of waveforms, such as the persistence renderer,
+		looks at the others."""
+		if events[-1] != self.trigger_index:
+			self.__retrigger(events)
+
+	def __retrigger(self, events):
+		retrigger = getattr(self.renderer, 'retrigger', None)
+		if retrigger is not None:
+			retrigger(self, events)
+		self.trigger_index = events[-1] if events else None
+		self.queue_redraw()
+
+	def get_sample_origin(self):
+		"""Return the index of the sample that is drawn at x = 0. Samples are
+		one unit of x apart. Unless the trace is locked to a trigger, the
+		buffer spans the trace horizontally, filling in from the right, with
+		the newest sample on the right."""
+		if self.trigger_index is not None:
+			return self.trigger_index
+		capacity = self.buffer.capacity
+		return self.buffer.total - capacity + capacity // 2
+
+	def get_visible_range(self):
+		"""Return the half-open range of sample indices that fall within the
+		width of the parent actor, with one sample of margin on either side so
+		that lines run off the edges."""
+		parent = self.get_parent()
+		if parent is None:
+			return self.buffer.total - len(self.buffer), self.buffer.total
+		half_w = 0.5 * parent.get_width()
+		x, y, scale, sy = self.get_graticule_transform()
+		# Use the smaller of the current and final scale so that nothing is
+		# cut off while a zoom is animating.
+		scale = min(scale, scale_for_level(self.scale_level_x) * self.get_scale()[0])
+		origin = self.get_sample_origin()
+		start = origin + int(math.floor((-half_w - x) / scale)) - 1
+		stop = origin + int(math.ceil((half_w - x) / scale)) + 2
+		return start, stop
+
+	def set_coarsening(self, factor):
+		"""Widen the buckets of the envelope by factor when zoomed out, to
+		draw factor times fewer vertices."""
+		if factor != self.coarsening:
+			self.coarsening = factor
+			self.queue_redraw()
+
+	def get_bucket(self):
+		"""Return the number of samples per bucket of the envelope at the
+		current x scale level: the number of samples per pixel column, times
+		the coarsening factor if that is more than one."""
+		bucket = samples_per_pixel(self.scale_level_x)
+		return bucket * self.coarsening if bucket > 1 else bucket
+
+	def get_envelope(self, start, stop):
+		"""Return the sample indices and values of the vertices that represent
+		the samples with indices in the half-open range [start, stop) at the
+		current x scale level, decimated if there is more than one sample per
+		pixel column."""
+		bucket = self.get_bucket()
+		if bucket > 1 and self.resampler is not None:
+			return self.resampler.envelope(start, stop, bucket)
+		if self.__envelope is not None:
+			key, envelope = self.__envelope
+			if key[0] == bucket and key[1] <= start and stop <= key[2]:
+				return envelope
+		if isinstance(self.buffer, MappedChannel):
+			# The samples of a mapped file never change, so find the envelope
+			# of a margin on either side of the window too, and keep it for
+			# later paints and small pans instead of reading the file again.
+			margin = int((stop - start) * MappedChannel.READ_AHEAD)
+			start, stop = start - margin, stop + margin
+			envelope = trace_envelope(self.buffer, None, start, stop, bucket)
+			self.set_envelope(envelope, start, stop, bucket)
+			return envelope
+		return trace_envelope(self.buffer, self.pyramid, start, stop, bucket)
+
+	def set_envelope(self, envelope, start=None, stop=None, bucket=None):
+		"""Supply the envelope of the samples with indices in the half-open
+		range [start, stop) (by default, the visible range) with the given
+		bucket size (by default, that of the current x scale level), computed
+		elsewhere, for example by a ChannelPool. get_envelope returns it in
+		place of computing one for any range within [start, stop) at that
+		bucket size, until another is supplied, even if samples have been
+		appended since. Pass None to compute envelopes while painting
+		again."""
+		if envelope is None:
+			self.__envelope = None
+			return
+		if start is None or stop is None:
+			start, stop = self.get_visible_range()
+		if bucket is None:
+			bucket = self.get_bucket()
+		self.__envelope = ((bucket, start, stop), envelope)
+
+	def do_paint(self):
+		t0 = timeit.default_timer()
+		start, stop = self.get_visible_range()
+		# Count the samples in view from the bounds of the buffer rather than
+		# from its window, which would read a recording.
+		total = self.buffer.total
+		samples = max(0, min(stop, total) - max(start, total - len(self.buffer)))
+		vertices = 0
+		if samples:
+			Cogl.set_source_color(cogl_color_from_clutter_color(self.color))
+			vertices = self.renderer.paint(self, start, stop)
+			bucket = self.get_bucket()
+			if bucket >= MIN_BUCKET and self.pyramid is not None and self.pyramid.depth:
+				samples >>= self.pyramid.level(bucket)
+		if isinstance(self.buffer, MappedChannel):
+			self.buffer.read_ahead(start, stop)
+		frame_stats.record(stats_name(self), timeit.default_timer() - t0, vertices, samples)
+
+
+class PathTraceRenderer(object):
+	"""Draws a trace by building a Cogl path from scratch on every frame."""
+
+	def paint(self, trace, start, stop):
+		i, y = trace.get_envelope(start, stop)
+		x = i - trace.get_sample_origin()
+
+		# Plot trace, setting down lines wherever both x and y are finite
+		# (neither NaN, nor infinity, nor minus infinity)
+		for x, y in finite_runs(x, y):
+			path_polyline(x, y)
+		Cogl.path_stroke()
+		return len(i)
+
+
+class VertexBufferTraceRenderer(object):
+	"""Draws a trace from vertex buffers that are retained on the GPU.
+
+	The samples are mirrored in a vertex buffer with the same layout as the
+	trace's RingBuffer: sample i is the vertex in slot i modulo the capacity,
+	at (slot, -y). Only newly appended samples are uploaded, in place. The
+	visible samples are drawn as line strips over ranges of slots, translated
+	into position, with one draw call per run of finite samples.
+
+	When the trace is zoomed out to more than one sample per pixel column, or
+	its samples are in a file rather than a RingBuffer, the envelope is
+	uploaded to a second, smaller vertex buffer on each frame and drawn the
+	same way."""
+
+	def __init__(self):
+		self.__samples = None
+		self.__uploaded = 0
+		self.__envelope = None
+
+	@staticmethod
+	def __new_primitive(n):
+		context = Clutter.get_default_backend().get_cogl_context()
+		vertices = numpy.zeros((n, 2), dtype=numpy.float32)
+		buffer = Cogl.AttributeBuffer.new(context, vertices.nbytes, vertices.tobytes())
+		attribute = Cogl.Attribute.new(buffer, 'cogl_position_in',
+			vertices.strides[0], 0, 2, Cogl.AttributeType.FLOAT)
+		primitive = Cogl.Primitive.new_with_attributes(Cogl.VerticesMode.LINE_STRIP, n, [attribute])
+		return buffer, primitive
+
+	@staticmethod
+	def __upload(buffer, slot, x, y):
+		vertices = numpy.empty((len(y), 2), dtype=numpy.float32)
+		vertices[:, 0] = x
+		vertices[:, 1] = y
+		vertices[:, 1] *= -1
+		buffer.set_data(slot * vertices.strides[0], vertices.tobytes(), vertices.nbytes)
+
+	@staticmethod
+	def __draw(primitive, x, y, first, dx):
+		"""Draw the finite runs of the vertices (x, y), which are stored
+		starting at slot first, translated by dx. Return the number of
+		vertices drawn."""
+		if dx:
+			Cogl.push_matrix()
+			Cogl.translate(dx, 0, 0)
+		vertices = 0
+		for xx, yy in finite_runs(x, y):
+			if len(xx) > 1:
+				primitive.set_first_vertex(first + int(xx[0] - x[0]))
+				primitive.set_n_vertices(len(xx))
+				primitive.draw()
+				vertices += len(xx)
+		if dx:
+			Cogl.pop_matrix()
+		return vertices
+
+	def __sync(self, trace):
+		"""Upload samples that have been appended since the last frame."""
+		buffer = trace.buffer
+		if self.__samples is None:
+			self.__samples = self.__new_primitive(buffer.capacity)
+			self.__uploaded = 0
+		start = max(self.__uploaded, buffer.total - len(buffer))
+		for i0, y in buffer.window(start, buffer.total):
+			slot = i0 % buffer.capacity
+			self.__upload(self.__samples[0], slot, numpy.arange(slot, slot + len(y)), y)
+		self.__uploaded = buffer.total
+
+	def paint(self, trace, start, stop):
+		origin = trace.get_sample_origin()
+		if trace.get_bucket() > 1 or not isinstance(trace.buffer, RingBuffer):
+			i, y = trace.get_envelope(start, stop)
+			if self.__envelope is None or self.__envelope[2] < len(y):
+				n = 1 << int(len(y) - 1).bit_length()
+				self.__envelope = self.__new_primitive(n) + (n,)
+			x = i - origin
+			self.__upload(self.__envelope[0], 0, x, y)
+			return self.__draw(self.__envelope[1], numpy.arange(len(y)), y, 0, 0)
+
+		self.__sync(trace)
+		capacity = trace.buffer.capacity
+		last = None
+		vertices = 0
+		for i0, y in trace.buffer.window(start, stop):
+			slot = i0 % capacity
+			dx = i0 - slot - origin
+			x = numpy.arange(slot, slot + len(y))
+			vertices += self.__draw(self.__samples[1], x, y, slot, dx)
+			# Join the pieces on either side of the wrap-around in the buffer.
+			if last is not None and numpy.isfinite(last[1]) and numpy.isfinite(y[0]):
+				Cogl.path_line(last[0], -last[1], i0 - origin, -y[0])
+				Cogl.path_stroke()
+			last = (i0 + len(y) - 1 - origin, y[-1])
+		return vertices
+
+
+class PersistenceTraceRenderer(object):
+	"""Draws a trace as a persistence display. Each waveform is accumulated
+	into a Phosphor at the resolution of the graticule as soon as it is
+	complete, even if several arrive between frames: when the trace runs
+	free, every block of samples that is appended to it makes a waveform,
+	and when it is triggered, every trigger event does, once the samples in
+	view after the event have arrived or the next event comes. Waveforms
+	are only queued as they come; painting applies all of them to the
+	phosphor at once, uploads it as a single texture if it has changed,
+	and draws it over the graticule. Changing the size of the graticule, or the
+	position or scale levels of the trace, starts over.
+
+	The trace calls appended() after samples are appended to it, and
+	retrigger() with the trigger events that it is about to move through."""
+
+	"""Fraction of its brightness that the phosphor keeps per waveform"""
+	DECAY = 0.9
+
+	def __init__(self):
+		self.phosphor = None
+		self.__texture = None
+		self.__geometry = None
+		self.__fresh = False
+		self.__dirty = False
+		self.__pending = None
+		self.__vertices = 0
+
+	def __prepare(self, trace):
+		"""Start over if the geometry has changed, and return the size of the
+		graticule and the transform of the trace, or None if the trace is not
+		on a graticule."""
+		parent = trace.get_parent()
+		if parent is None:
+			return None
+		w, h = parent.get_size()
+		width = int(math.ceil(w))
+		height = int(math.ceil(h))
+		tx, ty, sx, sy = trace.get_graticule_transform()
+
+		geometry = (width, height, tx, ty, trace.scale_level_x, trace.scale_level_y)
+		if geometry != self.__geometry:
+			self.phosphor = Phosphor(width, height, self.DECAY)
+			self.__texture = None
+			self.__geometry = geometry
+			self.__fresh = True
+			self.__dirty = True
+		return width, height, tx, ty, sx, sy
+
+	def __accumulate(self, trace, origin=None):
+		"""Queue the waveform in view, in graticule pixels, or the one that
+		would be in view if the sample with index origin were at x = 0."""
+		self.__pending = None
+		transform = self.__prepare(trace)
+		if transform is None:
+			return
+		width, height, tx, ty, sx, sy = transform
+		start, stop = trace.get_visible_range()
+		if origin is None:
+			origin = trace.get_sample_origin()
+		else:
+			shift = origin - trace.get_sample_origin()
+			start += shift
+			stop += shift
+		i, y = trace.get_envelope(start, stop)
+		x = i - origin
+		self.phosphor.add(0.5 * width + tx + sx * x, 0.5 * height + ty - sy * y)
+		self.__fresh = False
+		self.__dirty = True
+		self.__vertices += len(i)
+
+	def __complete(self, trace):
+		return self.__pending is not None and trace.buffer.total >= self.__pending
+
+	def appended(self, trace):
+		"""Accumulate the waveform that the samples just appended to trace
+		make, or complete."""
+		if trace.trigger_index is None or self.__complete(trace):
+			self.__accumulate(trace)
+
+	def retrigger(self, trace, events):
+		"""Accumulate the waveform around the current trigger event if it
+		has not been yet, and those around all but the last of events, the
+		indices of the trigger events that trace is about to move through;
+		then wait for the samples in view after the last one."""
+		if self.__pending is not None:
+			self.__accumulate(trace)
+		for index in events[:-1]:
+			self.__accumulate(trace, index)
+		if events:
+			start, stop = trace.get_visible_range()
+			self.__pending = events[-1] + stop - trace.get_sample_origin()
+
+	def paint(self, trace, start, stop):
+		transform = self.__prepare(trace)
+		if transform is None:
+			return 0
+		if self.__fresh or self.__complete(trace):
+			self.__accumulate(trace)
+		width, height, tx, ty, sx, sy = transform
+
+		if self.__dirty:
+			c = trace.color
+			rgba = self.phosphor.image(c.red, c.green, c.blue)
+			rowstride = rgba.strides[0]
+			if self.__texture is None:
+				self.__texture = Cogl.Texture.new_from_data(width, height,
+					Cogl.TextureFlags.NONE, Cogl.PixelFormat.RGBA_8888_PRE,
+					Cogl.PixelFormat.ANY, rowstride, rgba.tobytes())
+			else:
+				self.__texture.set_region(0, 0, 0, 0, width, height, width, height,
+					Cogl.PixelFormat.RGBA_8888_PRE, rowstride, rgba.tobytes())
+			self.__dirty = False
+
+		# Undo the translation and scale of the trace and its group, and draw
+		# the texture over the whole graticule.
+		Cogl.push_matrix()
+		Cogl.scale(1. / sx, 1. / sy, 1.)
+		Cogl.translate(-tx, -ty, 0.)
+		Cogl.set_source_texture(self.__texture)
+		Cogl.rectangle(-0.5 * width, -0.5 * height, 0.5 * width, 0.5 * height)
+		Cogl.pop_matrix()
+		vertices, self.__vertices = self.__vertices, 0
+		return vertices
+
+
+class SpectrumTraceRenderer(object):
+	"""Draws the power spectral density estimated by the trace's spectrum
+	against logarithmic frequency, from the lowest nonzero frequency at the
+	left edge of the graticule to the Nyquist frequency at the right edge, at
+	unit scale. Frequency bins are combined per pixel column at the current
+	x scale. The vertical axis is PIXELS_PER_DECADE times the common logarithm
+	of the PSD, relative to the median of the first spectrum that is drawn."""
+
+	PIXELS_PER_DECADE = 40
+
+	def __init__(self):
+		self.reference = None
+
+	def paint(self, trace, start, stop):
+		spectrum = trace.spectrum
+		parent = trace.get_parent()
+		if spectrum is None or spectrum.psd is None or parent is None:
+			return 0
+		w = parent.get_width()
+		sx = trace.get_graticule_transform()[2]
+		with numpy.errstate(divide='ignore'):
+			logpsd = numpy.log10(spectrum.psd[1:])
+		if self.reference is None:
+			finite = logpsd[numpy.isfinite(logpsd)]
+			if not len(finite):
+				return 0
+			self.reference = numpy.median(finite)
+		x, y = log_spectrum_envelope(spectrum.freqs[1:], logpsd, max(1, int(w * sx)))
+		x = x / sx - 0.5 * w
+		y = (y - self.reference) * self.PIXELS_PER_DECADE
+		for xx, yy in finite_runs(x, y):
+			path_polyline(xx, yy)
+		Cogl.path_stroke()
+		return len(x)
+
+
+"""Trace renderers by name, for Trace.set_renderer"""
+TRACE_RENDERERS = {
+	'path': PathTraceRenderer,
+	'vertex-buffer': VertexBufferTraceRenderer,
+	'persistence': PersistenceTraceRenderer,
+	'spectrum': SpectrumTraceRenderer
+}
+
+
+class TraceCollection(Trace):
+	"""Many channels that share a time base, drawn as a single actor.
+
+	The samples of all of the channels are stored in the rows of one
+	RingBuffer, and on each frame all of the channels are drawn with a single
+	draw call, as colored line segments from one vertex buffer that is
+	reused from frame to frame. Each channel is drawn at a vertical offset and
+	with a gain of its own. Channels can be added and removed at any time
+	without touching the scene graph; the storage for max_channels channels is
+	allocated up front."""
+
+	"""Default maximum number of channels in a collection"""
+	DEFAULT_MAX_CHANNELS = 256
+
+	def __init__(self, capacity=Trace.DEFAULT_CAPACITY, max_channels=DEFAULT_MAX_CHANNELS):
+		buffer = RingBuffer(capacity, channels=max_channels)
+		buffer.fill_channel(slice(None))
+		super(TraceCollection, self).__init__(buffer=buffer)
+		self.pyramid = MinMaxPyramid(buffer)
+		self.pyramid.clear_channel(slice(None))
+		self.channel_names = []
+		self.channel_colors = numpy.zeros((max_channels, 4), dtype=numpy.uint8)
+		self.channel_offsets = numpy.zeros(max_channels)
+		self.channel_gains = numpy.ones(max_channels)
+		self.__vertices = None
+		self.__primitive = None
+
+	def set_renderer(self, name):
+		"""Check that name is a valid renderer; a collection is always drawn in
+		a single batch, whichever renderer is selected."""
+		if name not in TRACE_RENDERERS:
+			raise ValueError('unknown trace renderer: %r' % (name,))
+		self.renderer = None
+
+	def set_spectrum(self, spectrum):
+		"""Check that spectrum is None; a collection always shows the samples
+		themselves."""
+		if spectrum is not None:
+			raise TypeError('a TraceCollection cannot show a spectrum')
+
+	def add_channel(self, name, color=None, offset=0., gain=1.):
+		"""Add a channel, drawn in color (by default, the collection's color)
+		offset vertically by offset and with samples multiplied by gain.
+		Return its row in the arrays passed to append_data. The new channel
+		has no samples until the next call to append_data."""
+		row = len(self.channel_names)
+		if row == self.buffer.channels:
+			raise ValueError('collection is full (%d channels)' % row)
+		if name in self.channel_names:
+			raise ValueError('duplicate channel name: %r' % (name,))
+		if color is None:
+			color = self.color
+		self.buffer.fill_channel(row)
+		self.pyramid.clear_channel(row)
+		self.channel_names.append(name)
+		self.channel_colors[row] = (color.red, color.green, color.blue, color.alpha)
+		self.channel_offsets[row] = offset
+		self.channel_gains[row] = gain
+		self.queue_redraw()
+		return row
+
+	def remove_channel(self, name):
+		"""Remove a channel. The channels after it move up a row."""
+		row = self.channel_names.index(name)
+		del self.channel_names[row]
+		self.buffer.remove_channel(row)
+		self.pyramid.remove_channel(row)
+		for array in (self.channel_colors, self.channel_offsets, self.channel_gains):
+			array[row:-1] = array[row + 1:]
+		self.queue_redraw()
+
+	def append_data(self, block):
+		"""Append a block of samples to all of the channels at once. block is a
+		2D array with a row per channel, in the order that they were added."""
+		n = len(self.channel_names)
+		block = numpy.asarray(block, dtype=self.buffer.dtype).reshape(n, -1)
+		if block.shape[1]:
+			if n < self.buffer.channels:
+				block = numpy.concatenate((block,
+					numpy.full((self.buffer.channels - n, block.shape[1]), numpy.nan)))
+			start = self.buffer.total
+			self.buffer.append(block)
+			self.pyramid.update(start, self.buffer.total)
+			self.queue_redraw()
+			self.emit('data-appended', start, self.buffer.total)
+
+	def get_envelope(self, start, stop):
+		"""Return the sample indices and values of the vertices of each of the
+		channels, as 2D arrays with a row per channel; see Trace.get_envelope.
+		Unused rows of the buffer are skipped."""
+		n = len(self.channel_names)
+		bucket = self.get_bucket()
+		if bucket >= MIN_BUCKET and self.pyramid.depth and self.buffer.window(start, stop):
+			return self.pyramid.envelope(start, stop, bucket, slice(0, n))
+		parts = [minmax_envelope(y[:n], i0, bucket) for i0, y in self.buffer.window(start, stop)]
+		if not parts:
+			return numpy.empty((n, 0), dtype=numpy.intp), numpy.empty((n, 0))
+		i, y = zip(*parts)
+		return numpy.concatenate(i, axis=-1), numpy.concatenate(y, axis=-1)
+
+	def __draw(self, vertices):
+		"""Upload the vertices to the shared vertex buffer, growing it if
+		necessary, and draw them as lines."""
+		n = len(vertices)
+		if self.__primitive is None or self.__primitive[2] < n:
+			size = 1 << int(max(n, 2) - 1).bit_length()
+			context = Clutter.get_default_backend().get_cogl_context()
+			data = numpy.zeros(size, dtype=SEGMENT_VERTEX)
+			buffer = Cogl.AttributeBuffer.new(context, data.nbytes, data.tobytes())
+			position = Cogl.Attribute.new(buffer, 'cogl_position_in',
+				SEGMENT_VERTEX.itemsize, SEGMENT_VERTEX.fields['position'][1],
+				2, Cogl.AttributeType.FLOAT)
+			color = Cogl.Attribute.new(buffer, 'cogl_color_in',
+				SEGMENT_VERTEX.itemsize, SEGMENT_VERTEX.fields['color'][1],
+				4, Cogl.AttributeType.UNSIGNED_BYTE)
+			color.set_normalized(True)
+			primitive = Cogl.Primitive.new_with_attributes(Cogl.VerticesMode.LINES, size, [position, color])
+			self.__primitive = (buffer, primitive, size)
+		buffer, primitive, size = self.__primitive
+		buffer.set_data(0, vertices.tobytes(), vertices.nbytes)
+		primitive.set_n_vertices(n)
+		primitive.draw()
+
+	def do_paint(self):
+		t0 = timeit.default_timer()
+		n = len(self.channel_names)
+		vertices = samples = 0
+		if n:
+			start, stop = self.get_visible_range()
+			i, y = self.get_envelope(start, stop)
+			if i.shape[-1] > 1:
+				x = (i - self.get_sample_origin()).astype(numpy.float32)
+				y = self.channel_offsets[:n, numpy.newaxis] - self.channel_gains[:n, numpy.newaxis] * y
+				batch = segment_vertices(x, y, self.channel_colors[:n], self.__vertices)
+				self.__vertices = batch.base
+				if len(batch):
+					self.__draw(batch)
+				vertices = len(batch)
+				samples = n * sum(region.shape[-1] for i0, region in self.buffer.window(start, stop))
+				bucket = self.get_bucket()
+				if bucket >= MIN_BUCKET and self.pyramid.depth:
+					samples >>= self.pyramid.level(bucket)
+		frame_stats.record(stats_name(self), timeit.default_timer() - t0, vertices, samples)
+
+
+class MathTrace(Trace):
+	"""Trace derived from other traces by an arithmetic expression over their
+	names; see MathChannel. Whenever samples are appended to one of its
+	inputs, the samples that all of the inputs now have are evaluated and
+	appended to it, so that it can be labeled, colored, zoomed, measured,
+	and recorded like any other trace."""
+
+	def __init__(self, expression, inputs, capacity=Trace.DEFAULT_CAPACITY, renderer='path'):
+		super(MathTrace, self).__init__(capacity, renderer)
+		self.channel = MathChannel(expression, dict((name, trace.buffer) for name, trace in inputs.items()))
+		self.__handlers = [(inputs[name], inputs[name].connect('data-appended', self.input_appended))
+			for name in self.channel.names]
+		self.connect('destroy', self.destroyed)
+		self.set_name(expression)
+		self.input_appended()
+
+	def destroyed(self, actor):
+		for trace, handler in self.__handlers:
+			trace.disconnect(handler)
+		self.__handlers = []
+
+	def input_appended(self, *args):
+		"""Inputs' data-appended signal handler."""
+		result = self.channel.update()
+		if result is not None:
+			start, block = result
+			# Keep the sample indices of the inputs across any gap.
+			self.append_block(start, block)
+
+
+class TraceLabel(Clutter.Group):
+	"""Label for a trace showing its name, color, and scale, and the results of
+	its measurements if it has any. The measurements are refreshed a few
+	times per second rather than as samples arrive, and the text is only
+	laid out again when it changes."""
+
+	"""Refresh interval for measurements in milliseconds"""
+	INTERVAL = 500
+
+	def __init__(self, trace):
+		super(TraceLabel, self).__init__()
+		self.trace = trace
+		self.set_size(*LABEL_SIZE)
+		self.name_label = Clutter.Text()
+		self.name_label.set_color(color_from_string('black'))
+		self.name_label.set_text('foo bar')
+		self.add_actor(self.name_label)
+		self.name_label.set_position(6, 6)
+		self.name_label.set_size(*self.get_size())
+		self.measurements_label = Clutter.Text()
+		self.measurements_label.set_font_name('Monospace 5')
+		self.measurements_label.set_color(color_from_string('black'))
+		self.add_actor(self.measurements_label)
+		self.measurements_label.set_position(6, 19)
+		self.__processed = None
+		self.__dropped = 0
+		self.paused = False
+		self.__source = GLib.timeout_add(self.INTERVAL, self.refresh)
+		self.connect('destroy', self.destroyed)
+		self.connect('paint', self.paint)
+		self.trace.connect_after('notify::color', self.color_changed)
+		self.trace.connect_after('notify::name', self.name_changed)
+
+	def destroyed(self, actor):
+		if self.__source is not None:
+			GLib.source_remove(self.__source)
+			self.__source = None
+
+	def refresh(self):
+		"""Show the current results of the trace's measurements, if there are
+		new samples since the last refresh, and the number of chunks that its
+		recorder has dropped, unless refreshing is paused."""
+		if self.paused:
+			return True
+		recorder = self.trace.recorder
+		dropped = 0 if recorder is None else recorder.dropped
+		if dropped != self.__dropped:
+			self.__dropped = dropped
+			self.name_changed(None, None)
+		measurements = self.trace.measurements
+		processed = None if measurements is None else measurements.processed
+		if processed != self.__processed:
+			self.__processed = processed
+			if measurements is None:
+				text = ''
+			else:
+				r = measurements.results()
+				text = '\n'.join((
+					'mean %-9.3g rms %.3g' % (r['mean'], r['rms']),
+					'min  %-9.3g max %.3g' % (r['min'], r['max']),
+					'p-p  %-9.3g f   %.3g Hz' % (r['peak_to_peak'], r['dominant_frequency']),
+					'zero crossings %.3g/s' % r['zero_crossing_rate']))
+			if text != self.measurements_label.get_text():
+				self.measurements_label.set_text(text)
+		return True
+
+	def color_changed(self, param, user_data):
+		self.queue_redraw()
+
+	def name_changed(self, param, user_data):
+		text = self.trace.get_name() or ''
+		if self.__dropped:
+			text += ' (%d chunks not recorded)' % self.__dropped
+		self.name_label.set_text(text)
+
+	@staticmethod
+	def paint(self):
+		"""paint signal handler."""
+		t0 = timeit.default_timer()
+		w, h = self.get_size()
+		color = self.trace.color
+		dark_color = color.darken()
+
+		Cogl.set_source_color(cogl_color_from_clutter_color(dark_color))
+		Cogl.path_round_rectangle(0, 0, w, h, 5, 10)
+		Cogl.path_fill()
+
+		Cogl.set_source_color(cogl_color_from_clutter_color(color))
+		Cogl.path_round_rectangle(3, 3, w - 3, h - 3, 3, 10)
+		Cogl.path_fill()
+		frame_stats.record('label %s' % stats_name(self.trace), timeit.default_timer() - t0)
+
+
+class StatsOverlay(Clutter.Group):
+	"""On-stage readout of frame statistics: frames per second, mean and worst
+	paint time per frame, acquisition queue depth, and the paint cost of the
+	most expensive actors. It refreshes itself a few times per second rather
+	than on every frame."""
+
+	"""Refresh interval in milliseconds"""
+	INTERVAL = 500
+
+	"""Number of actors to list"""
+	TOP = 8
+
+	def __init__(self, stats=None):
+		super(StatsOverlay, self).__init__()
+		self.stats = stats or frame_stats
+		self.text = Clutter.Text()
+		self.text.set_font_name('Monospace 9')
+		self.text.set_color(color_from_string('#e0e0e0'))
+		self.add_actor(self.text)
+		self.__source = None
+		self.connect('show', self.shown)
+		self.connect('hide', self.hidden)
+		self.connect('destroy', self.hidden)
+
+	def shown(self, actor):
+		self.stats.enabled = True
+		if self.__source is None:
+			self.__source = GLib.timeout_add(self.INTERVAL, self.refresh)
+
+	def hidden(self, actor):
+		self.stats.enabled = False
+		if self.__source is not None:
+			GLib.source_remove(self.__source)
+			self.__source = None
+
+	def refresh(self):
+		summary = self.stats.summary()
+		lines = ['%5.1f fps  mean %5.1f ms  worst %5.1f ms  queue %d' % (
+			summary['fps'], 1e3 * summary['mean_seconds'],
+			1e3 * summary['worst_seconds'], summary['queue_depth'])]
+		actors = sorted(summary['actors'].items(), key=lambda item: -item[1]['seconds'])
+		for name, cost in actors[:self.TOP]:
+			lines.append('%-24s %6.2f ms %8d vtx %10d smp' % (
+				name[:24], 1e3 * cost['seconds'], cost['vertices'], cost['samples']))
+		self.text.set_text('\n'.join(lines))
+		return True
+
+
+def main():
+	# Initialize Clutter
+	Clutter.init(sys.argv)
+
+	# Disable font mipmapping (see <http://bugzilla.clutter-project.org/show_bug.cgi?id=2584>)
+	Clutter.set_font_flags(0)
+
+	# Set up stage.
+	stage = Clutter.Stage.get_default()
+	stage.set_size(576, 576)
+	stage.set_user_resizable(True)
+	stage.connect('destroy', lambda *args: Clutter.main_quit())
+
+	scope = ClutterScope()
+	stage.add_actor(scope)
+	scope.set_reactive(True)
+	constraint = Clutter.BindConstraint()
+	constraint.set_coordinate(Clutter.BindCoordinate.SIZE | Clutter.BindCoordinate.POSITION)
+	constraint.set_source(stage)
+	scope.add_constraint(constraint)
+
+	# Show everything.
+	stage.show_all()
+
+	# Start main loop.
+	Clutter.main()
+
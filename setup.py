@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+from setuptools import setup
+
+
+setup(
+	name='clutterscope',
+	version='0.1',
+	description='Clutter-based software digital storage oscilloscope',
+	author='Leo Singer',
+	author_email='leo.singer@ligo.org',
+	packages=['clutterscope'],
+	install_requires=['numpy'],
+	entry_points={
+		'gui_scripts': ['clutterscope = clutterscope:main']
+	}
+)
@@ -0,0 +1,71 @@
+"""
+Tests that QualityGovernor settles on a quality level that meets its frame
+rate target, on a simulated paint cost.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+from clutterscope.data import QualityGovernor
+
+
+def paint_seconds(governor, load):
+	"""Simulated paint time of a frame: traces whose cost is proportional to
+	load and to their number of vertices, plus labels and ticks."""
+	return (load / governor.vertex_scale
+		+ 0.004 * governor.label_refresh + 0.002 * governor.tick_detail)
+
+
+class TestQualityGovernor(unittest.TestCase):
+
+	def run_frames(self, governor, load, frames):
+		for frame in range(frames):
+			governor.update(paint_seconds(governor, load))
+
+	def test_converges(self):
+		"""Under heavy load, the level rises until paint time is within the
+		budget and then stays put; once the load goes away, full quality
+		returns."""
+		governor = QualityGovernor(target_fps=60.)
+		self.run_frames(governor, 0.044, 1000)
+		level = governor.level
+		self.assertGreater(level, 0)
+		self.assertLessEqual(paint_seconds(governor, 0.044), governor.budget)
+		# One step less would miss the budget.
+		governor.level -= 1
+		self.assertGreater(paint_seconds(governor, 0.044), governor.budget)
+		governor.level += 1
+		# It does not oscillate.
+		changes = len(governor.decisions())
+		self.run_frames(governor, 0.044, 1000)
+		self.assertEqual(governor.level, level)
+		self.assertEqual(len(governor.decisions()), changes)
+		self.assertTrue(all(d['to'] == d['from'] + 1 for d in governor.decisions()))
+
+		self.run_frames(governor, 0.001, 1000)
+		self.assertEqual(governor.level, 0)
+		self.assertEqual(governor.state()['vertex_scale'], 1)
+
+	def test_light_load(self):
+		"""A load that is already within the budget is drawn at full
+		quality."""
+		governor = QualityGovernor(target_fps=60.)
+		self.run_frames(governor, 0.008, 500)
+		self.assertEqual(governor.level, 0)
+		self.assertEqual(governor.decisions(), [])
+
+	def test_hold(self):
+		"""The level changes at most once every hold frames."""
+		governor = QualityGovernor(target_fps=60., window=4, hold=20)
+		self.run_frames(governor, 1., 100)
+		frames = [d['frame'] for d in governor.decisions()]
+		self.assertEqual(frames, [20, 40, 60, 80, 100])
+		self.assertEqual(governor.level, len(governor.steps))
+		self.assertFalse(governor.label_refresh)
+		self.assertFalse(governor.tick_detail)
+		self.assertEqual(governor.vertex_scale, 8)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests of MathChannel, and of the sample indices that an Acquisition keeps so
+that the inputs of a math channel stay in step.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+import numpy
+from clutterscope.data import RingBuffer, SegmentedChannel, MathChannel, Acquisition
+
+
+class TestMathChannel(unittest.TestCase):
+
+	def test_contiguous(self):
+		a = RingBuffer(100)
+		b = RingBuffer(100)
+		math = MathChannel('2 * A - B', {'A': a, 'B': b})
+		a.append(numpy.arange(10.))
+		b.append(numpy.ones(6))
+		start, y = math.update()
+		self.assertEqual(start, 0)
+		numpy.testing.assert_array_equal(y, 2 * numpy.arange(6.) - 1)
+		self.assertIsNone(math.update())
+		b.append(numpy.ones(4))
+		start, y = math.update()
+		self.assertEqual(start, 6)
+		numpy.testing.assert_array_equal(y, 2 * numpy.arange(6., 10.) - 1)
+
+	def test_gapped_input(self):
+		"""Samples in the gaps of an input are NaN, at their own offsets."""
+		a = SegmentedChannel()
+		b = RingBuffer(100)
+		a.append(numpy.arange(4.), 0.)
+		a.append(numpy.arange(7., 10.), 7.)
+		a.append(numpy.arange(12., 14.), 12.)
+		b.append(numpy.zeros(14))
+		math = MathChannel('A + B', {'A': a, 'B': b})
+		start, y = math.update()
+		expected = numpy.arange(14.)
+		expected[4:7] = expected[10:12] = numpy.nan
+		self.assertEqual(start, 0)
+		numpy.testing.assert_array_equal(y, expected)
+
+
+class Channel(object):
+	"""Stands in for a Trace that an Acquisition appends to."""
+
+	def __init__(self, capacity=100):
+		self.buffer = RingBuffer(capacity)
+
+	def append_block(self, start, block):
+		if start > self.buffer.total:
+			self.buffer.advance(start - self.buffer.total)
+		self.buffer.append(block)
+
+
+class TestAcquisition(unittest.TestCase):
+
+	def test_dropped_blocks_keep_indices(self):
+		"""A block that the queue drops for one channel leaves a gap in it,
+		so that its samples stay in step with those of another channel."""
+		acquisition = Acquisition(maxsize=3)
+		a = Channel()
+		b = Channel()
+		acquisition.queue.put(a, (0, numpy.arange(4.)))
+		acquisition.queue.put(b, (0, numpy.arange(4.)))
+		acquisition.queue.put(a, (4, numpy.arange(4., 8.)))
+		# The queue is full, so this drops the first block for a.
+		acquisition.queue.put(b, (4, numpy.arange(4., 8.)))
+		self.assertEqual(acquisition.drain(), 3)
+		self.assertEqual(a.buffer.total, b.buffer.total)
+		math = MathChannel('A - B', {'A': a.buffer, 'B': b.buffer})
+		start, y = math.update()
+		numpy.testing.assert_array_equal(y[:4], numpy.nan)
+		numpy.testing.assert_array_equal(y[4:], 0.)
+
+
+if __name__ == '__main__':
+	unittest.main()
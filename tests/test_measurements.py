@@ -0,0 +1,77 @@
+"""
+Tests of Measurements on signals whose measurements are known.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import math
+import unittest
+import numpy
+from clutterscope.data import Measurements
+
+
+class TestMeasurements(unittest.TestCase):
+
+	sample_rate = 1024.
+
+	def sine(self, n, amplitude=1., frequency=64., offset=0.):
+		t = numpy.arange(n) / self.sample_rate
+		return offset + amplitude * numpy.sin(2 * numpy.pi * frequency * t)
+
+	def test_sine(self):
+		measurements = Measurements(self.sample_rate, window=1 << 14, chunk=256, nfft=1024)
+		y = self.sine(1 << 14, amplitude=3.)
+		for block in numpy.array_split(y, 37):
+			measurements.process(block)
+		r = measurements.results()
+		self.assertEqual(r['samples'], 1 << 14)
+		self.assertAlmostEqual(r['mean'], 0., places=6)
+		self.assertAlmostEqual(r['rms'], 3. / math.sqrt(2), places=6)
+		self.assertAlmostEqual(r['min'], -3., places=3)
+		self.assertAlmostEqual(r['max'], 3., places=3)
+		self.assertAlmostEqual(r['peak_to_peak'], 6., places=3)
+		self.assertAlmostEqual(r['zero_crossing_rate'], 2 * 64., delta=0.1)
+		self.assertEqual(r['dominant_frequency'], 64.)
+
+	def test_offset(self):
+		measurements = Measurements(self.sample_rate, window=4096, chunk=512)
+		measurements.process(self.sine(4096, amplitude=2., offset=5.))
+		r = measurements.results()
+		self.assertAlmostEqual(r['mean'], 5., places=6)
+		self.assertAlmostEqual(r['rms'], math.sqrt(25. + 2.), places=6)
+		self.assertEqual(r['zero_crossing_rate'], 0.)
+
+	def test_window_slides(self):
+		"""Only the most recent window of samples is measured, along with the
+		chunk being filled."""
+		measurements = Measurements(window=1000, chunk=100)
+		measurements.process(numpy.full(5000, 7.))
+		measurements.process(numpy.full(1050, -1.))
+		r = measurements.results()
+		self.assertEqual(r['samples'], 1050)
+		self.assertEqual(r['mean'], -1.)
+		self.assertEqual(r['max'], -1.)
+		self.assertEqual(measurements.processed, 6050)
+
+	def test_non_finite(self):
+		"""Non-finite samples are not measured, and do not count as zero
+		crossings."""
+		measurements = Measurements(window=64, chunk=8)
+		measurements.process([1., numpy.nan, -1., 1., numpy.inf, 3., -3.])
+		r = measurements.results()
+		self.assertEqual(r['samples'], 7)
+		self.assertEqual(r['mean'], 0.2)
+		self.assertEqual(r['min'], -3.)
+		self.assertEqual(r['max'], 3.)
+		self.assertAlmostEqual(r['zero_crossing_rate'], 2. / 7)
+
+	def test_empty(self):
+		r = Measurements().results()
+		self.assertEqual(r['samples'], 0)
+		for key in ('mean', 'rms', 'min', 'max', 'dominant_frequency'):
+			self.assertTrue(math.isnan(r[key]), key)
+
+
+if __name__ == '__main__':
+	unittest.main()
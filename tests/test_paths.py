@@ -0,0 +1,83 @@
+"""
+Tests of the splitting of traces into runs of finite samples, against the
+per-sample loop that Trace.do_paint used to build its path with.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+import numpy
+from clutterscope.data import finite_runs, polyline_coords
+
+
+def reference_runs(x, y):
+	"""Return the polylines, as lists of (x, -y) points, that the old loop
+	would have added to the path: a move_to starts a polyline and a line_to
+	extends it."""
+	polylines = []
+	pendown = False
+	for x, y in zip(x, y):
+		if numpy.isfinite(x) and numpy.isfinite(y):
+			if pendown:
+				polylines[-1].append((x, -y))
+			else:
+				polylines.append([(x, -y)])
+				pendown = True
+		else:
+			pendown = False
+	return polylines
+
+
+def vectorized_runs(x, y):
+	"""Return the polylines that finite_runs and polyline_coords produce, in
+	the same form as reference_runs."""
+	polylines = []
+	for xx, yy in finite_runs(x, y):
+		coords = polyline_coords(xx, yy)
+		polylines.append(list(zip(coords[0::2].tolist(), coords[1::2].tolist())))
+	return polylines
+
+
+def as_float32(polylines):
+	return [[(float(numpy.float32(x)), float(numpy.float32(y))) for x, y in polyline]
+		for polyline in polylines]
+
+
+class TestFiniteRuns(unittest.TestCase):
+
+	def assertSameRuns(self, x, y):
+		self.assertEqual(vectorized_runs(x, y), as_float32(reference_runs(x, y)))
+
+	def test_random(self):
+		random = numpy.random.RandomState(0)
+		for n in (0, 1, 2, 3, 10, 1000):
+			for trial in range(20):
+				x = numpy.arange(n, dtype=float) - 0.5 * n
+				y = 20 * random.standard_normal(n)
+				for value in (numpy.nan, numpy.inf, -numpy.inf):
+					y[random.uniform(size=n) < 0.1] = value
+				x[random.uniform(size=n) < 0.05] = numpy.nan
+				self.assertSameRuns(x, y)
+
+	def test_all_finite(self):
+		x = numpy.arange(-400, 400)
+		self.assertSameRuns(x, 20 * numpy.sin(x * 0.1))
+
+	def test_none_finite(self):
+		x = numpy.arange(5.)
+		y = numpy.array([numpy.nan, numpy.inf, -numpy.inf, numpy.nan, numpy.nan])
+		self.assertEqual(finite_runs(x, y), [])
+		self.assertSameRuns(x, y)
+
+	def test_edges(self):
+		x = numpy.arange(6.)
+		y = numpy.array([numpy.inf, 1., 2., numpy.nan, 4., -numpy.inf])
+		self.assertEqual([xx.tolist() for xx, yy in finite_runs(x, y)], [[1., 2.], [4.]])
+		x[1] = -numpy.inf
+		self.assertEqual([xx.tolist() for xx, yy in finite_runs(x, y)], [[2.], [4.]])
+		self.assertSameRuns(x, y)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,37 @@
+"""
+Tests of Phosphor, the decaying histogram of the persistence display.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+import numpy
+from clutterscope.data import Phosphor
+
+
+class TestPhosphor(unittest.TestCase):
+
+	def test_flush_matches_accumulate(self):
+		"""Queuing waveforms and flushing them once gives the same hits as
+		accumulating them one at a time."""
+		random = numpy.random.RandomState(0)
+		one, batch = Phosphor(64, 48, 0.8), Phosphor(64, 48, 0.8)
+		for frame in range(5):
+			for waveform in range(random.randint(0, 6)):
+				x = numpy.linspace(-5, 70, 40)
+				y = 24 + 20 * random.standard_normal(40)
+				y[random.uniform(size=40) < 0.1] = numpy.nan
+				one.accumulate(x, y)
+				batch.add(x, y)
+			batch.flush()
+			numpy.testing.assert_allclose(batch.hits, one.hits, rtol=1e-5, atol=1e-6)
+
+	def test_image_flushes(self):
+		phosphor = Phosphor(16, 16)
+		phosphor.add([0, 15], [8, 8])
+		self.assertEqual(phosphor.image(255, 0, 0)[8, :15, 3].min(), 255)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,46 @@
+"""
+Tests of MinMaxPyramid against the samples that are in its RingBuffer.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+import numpy
+from clutterscope.data import RingBuffer, MinMaxPyramid
+
+
+class TestMinMaxPyramid(unittest.TestCase):
+
+	def assertNodesMatch(self, buffer, pyramid):
+		"""Check every node of every level against the samples it covers
+		that are still in the buffer."""
+		first = buffer.total - len(buffer)
+		for k in range(1, pyramid.depth + 1):
+			for j in range(first >> k, ((buffer.total - 1) >> k) + 1):
+				i = numpy.arange(max(j << k, first), min((j + 1) << k, buffer.total))
+				y = buffer.take(i)
+				finite = y[numpy.isfinite(y)]
+				x, yy = pyramid.envelope(j << k, (j + 1) << k, 1 << k)
+				expected = [finite.min(), finite.max()] if len(finite) else [numpy.nan, numpy.nan]
+				numpy.testing.assert_array_equal(yy[:2], expected)
+
+	def test_eviction(self):
+		random = numpy.random.RandomState(0)
+		for trial in range(20):
+			buffer = RingBuffer(random.randint(4, 100))
+			pyramid = MinMaxPyramid(buffer)
+			for block in range(12):
+				# Make each block larger than the last, so that the samples
+				# that are overwritten hold the extremes of the oldest nodes
+				# only if those nodes are stale.
+				y = (block + 1) * random.standard_normal(random.randint(1, 40))
+				y[random.uniform(size=len(y)) < 0.05] = numpy.nan
+				start = buffer.total
+				buffer.append(y)
+				pyramid.update(start, buffer.total)
+				self.assertNodesMatch(buffer, pyramid)
+
+
+if __name__ == '__main__':
+	unittest.main()
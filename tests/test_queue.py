@@ -0,0 +1,72 @@
+"""
+Tests of the backpressure policies of BlockQueue.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import threading
+import unittest
+from clutterscope.data import BlockQueue
+
+
+class TestBlockQueue(unittest.TestCase):
+
+	def test_drop_oldest(self):
+		queue = BlockQueue(3, BlockQueue.DROP_OLDEST)
+		for k in range(5):
+			self.assertTrue(queue.put('a' if k % 2 else 'b', k))
+		self.assertEqual(queue.drain(), [('b', 2), ('a', 3), ('b', 4)])
+		self.assertEqual(queue.dropped, 2)
+		self.assertEqual(dict(queue.dropped_by_key), {'a': 1, 'b': 1})
+		self.assertEqual(len(queue), 0)
+
+	def test_drop_newest(self):
+		queue = BlockQueue(3, BlockQueue.DROP_NEWEST)
+		results = [queue.put('a' if k % 2 else 'b', k) for k in range(5)]
+		self.assertEqual(results, [True, True, True, False, False])
+		self.assertEqual(queue.drain(), [('b', 0), ('a', 1), ('b', 2)])
+		self.assertEqual(queue.dropped, 2)
+		self.assertEqual(dict(queue.dropped_by_key), {'a': 1, 'b': 1})
+
+	def test_block(self):
+		"""A producer waits for room rather than dropping, and is let go by a
+		drain."""
+		queue = BlockQueue(2, BlockQueue.BLOCK)
+		queue.put('a', 0)
+		queue.put('a', 1)
+		results = []
+		producer = threading.Thread(target=lambda: results.append(queue.put('a', 2)))
+		producer.start()
+		producer.join(0.1)
+		self.assertTrue(producer.is_alive())
+		self.assertEqual(queue.drain(), [('a', 0), ('a', 1)])
+		producer.join(5)
+		self.assertFalse(producer.is_alive())
+		self.assertEqual(results, [True])
+		self.assertEqual(queue.drain(), [('a', 2)])
+		self.assertEqual(queue.dropped, 0)
+
+	def test_block_close(self):
+		"""Closing the queue lets a waiting producer go without queueing its
+		block, and refuses blocks from then on."""
+		queue = BlockQueue(1, BlockQueue.BLOCK)
+		queue.put('a', 0)
+		results = []
+		producer = threading.Thread(target=lambda: results.append(queue.put('a', 1)))
+		producer.start()
+		producer.join(0.1)
+		queue.close()
+		producer.join(5)
+		self.assertEqual(results, [False])
+		self.assertFalse(queue.put('a', 2))
+		self.assertEqual(queue.drain(), [('a', 0)])
+		self.assertFalse(queue.wait())
+
+	def test_policy(self):
+		self.assertRaises(ValueError, BlockQueue, 4, 'drop-everything')
+		self.assertRaises(ValueError, BlockQueue, 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,52 @@
+"""
+Tests of Resampler views of a window of a long channel.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+from clutterscope.data import RingBuffer, MappedChannel, Resampler
+
+
+class SmallResampler(Resampler):
+	MAX_STAGE_SAMPLES = 1000
+
+
+class TestResampler(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.data = numpy.random.RandomState(0).standard_normal(100000)
+		filename = os.path.join(self.directory, 'samples.npy')
+		numpy.save(filename, self.data)
+		self.mapped = MappedChannel(filename)
+		buffer = RingBuffer(len(self.data))
+		buffer.append(self.data)
+		self.reference = buffer
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_window(self):
+		"""A view of a window, after panning and zooming, matches the same
+		samples filtered from the start, without holding more than
+		MAX_STAGE_SAMPLES outputs in any stage."""
+		resampler = SmallResampler(self.mapped)
+		for start, stop, bucket in ((40000, 41000, 8), (60000, 61000, 8),
+				(59000, 60500, 8), (0, 100000, 128), (70000, 72000, 4)):
+			i, y = resampler.envelope(start, stop, bucket)
+			i_ref, y_ref = Resampler(self.reference).envelope(0, len(self.data), bucket)
+			keep = (i_ref >= start) & (i_ref < stop)
+			numpy.testing.assert_array_equal(i, i_ref[keep])
+			numpy.testing.assert_allclose(y, y_ref[keep], rtol=0, atol=1e-12)
+		for stage in resampler._Resampler__stages:
+			self.assertLessEqual(stage[1].capacity, SmallResampler.MAX_STAGE_SAMPLES + 4)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,71 @@
+"""
+Tests of the gaps between the segments of a SegmentedChannel.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+import numpy
+from clutterscope.data import SegmentedChannel, trace_envelope
+
+
+class TestSegmentedChannel(unittest.TestCase):
+
+	def setUp(self):
+		# Samples 0-9, a gap, 15-19 in two blocks, a gap, and 30-34
+		self.channel = SegmentedChannel(sample_rate=10., epoch=100.)
+		self.channel.append(numpy.arange(10.), 100.)
+		self.channel.append(numpy.arange(15., 17.), 101.5)
+		self.channel.append(numpy.arange(17., 20.))
+		self.channel.append(numpy.arange(30., 35.), 103.)
+
+	def test_segments(self):
+		channel = self.channel
+		self.assertEqual(channel.total, 35)
+		self.assertEqual(len(channel), 35)
+		self.assertEqual(channel.size, 20)
+		self.assertEqual([i0 for i0, y in channel.segments()], [0, 15, 30])
+		self.assertEqual(channel.gaps(0, 35), [(10, 15), (20, 30)])
+		self.assertEqual(channel.gaps(12, 25), [(12, 15), (20, 25)])
+		self.assertEqual(channel.gaps(15, 20), [])
+
+	def test_window(self):
+		"""A window across gaps comes back as separate runs."""
+		runs = self.channel.window(5, 32)
+		self.assertEqual([i0 for i0, y in runs], [5, 15, 30])
+		for i0, y in runs:
+			numpy.testing.assert_array_equal(y, numpy.arange(i0, i0 + len(y)))
+		self.assertEqual([len(y) for i0, y in runs], [5, 5, 2])
+		self.assertEqual(self.channel.window(10, 15), [])
+
+	def test_take(self):
+		"""Samples in gaps are NaN."""
+		numpy.testing.assert_array_equal(self.channel.take([0, 9, 10, 14, 15, 25, 34, 35]),
+			[0, 9, numpy.nan, numpy.nan, 15, numpy.nan, 34, numpy.nan])
+
+	def test_envelope(self):
+		"""The pen is lifted across gaps."""
+		i, y = trace_envelope(self.channel, None, 0, 35, 1)
+		numpy.testing.assert_array_equal(i, numpy.concatenate((
+			numpy.arange(10), [10], numpy.arange(15, 20), [20], numpy.arange(30, 35))))
+		numpy.testing.assert_array_equal(numpy.isnan(y), numpy.isin(i, [10, 20]))
+
+	def test_max_samples(self):
+		"""Discarding the oldest samples drops whole segments, and the gaps
+		before them."""
+		channel = SegmentedChannel(max_samples=8)
+		channel.append(numpy.arange(5.))
+		channel.append(numpy.arange(10., 15.), 10.)
+		self.assertEqual(channel.size, 8)
+		self.assertEqual([(i0, len(y)) for i0, y in channel.segments()], [(2, 3), (10, 5)])
+		channel.append(numpy.arange(20., 24.), 20.)
+		self.assertEqual([(i0, len(y)) for i0, y in channel.segments()], [(11, 4), (20, 4)])
+		self.assertEqual(channel.gaps(0, 24), [(15, 20)])
+
+	def test_back_in_time(self):
+		self.assertRaises(ValueError, self.channel.append, [1.], 103.2)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests of Trigger, which must find the same events however a stream is split
+into blocks.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+import numpy
+from clutterscope.data import Trigger
+
+
+def events_in_blocks(trigger, y, sizes):
+	"""Feed y to trigger in consecutive blocks of the given sizes, and
+	return all of the events."""
+	events = []
+	i0 = 0
+	for n in sizes:
+		events.append(trigger.process(y[i0:i0 + n], i0))
+		i0 += n
+	events.append(trigger.process(y[i0:], i0))
+	return numpy.concatenate(events)
+
+
+class TestTrigger(unittest.TestCase):
+
+	def setUp(self):
+		random = numpy.random.RandomState(0)
+		t = numpy.arange(5000)
+		self.y = numpy.sin(2 * numpy.pi * t / 97.) + 0.3 * random.standard_normal(len(t))
+		self.random = random
+
+	def splits(self):
+		"""Ways to split the stream into blocks: one sample at a time, in
+		blocks of a fixed size, and at random."""
+		n = len(self.y)
+		yield [1] * n
+		yield [64] * (n // 64)
+		yield self.random.randint(0, 300, size=40)
+
+	def test_block_split(self):
+		"""Every mode and slope finds the same events however the stream is
+		split into blocks."""
+		for mode in (Trigger.EDGE, Trigger.LEVEL, Trigger.PULSE):
+			for slope in (Trigger.RISING, Trigger.FALLING):
+				options = dict(mode=mode, slope=slope, level=0.2,
+					hysteresis=0.3, holdoff=30, min_width=10, max_width=60)
+				expected = Trigger(**options).process(self.y, 0)
+				self.assertTrue(len(expected), (mode, slope))
+				for sizes in self.splits():
+					numpy.testing.assert_array_equal(
+						events_in_blocks(Trigger(**options), self.y, sizes),
+						expected, err_msg='%s %s' % (mode, slope))
+
+	def test_edge(self):
+		"""A square wave triggers once per period on its rising edges, and
+		not at the start, where it is already high."""
+		y = numpy.tile(numpy.repeat([1., -1.], 10), 5)
+		numpy.testing.assert_array_equal(
+			Trigger(Trigger.EDGE, Trigger.RISING).process(y, 100),
+			[120, 140, 160, 180])
+		numpy.testing.assert_array_equal(
+			Trigger(Trigger.EDGE, Trigger.FALLING, holdoff=30).process(y, 0),
+			[10, 50, 90])
+
+	def test_pulse_width(self):
+		"""Only pulses with widths within [min_width, max_width] trigger, at
+		the sample where they end."""
+		y = numpy.zeros(100)
+		y[10:15] = y[30:50] = y[70:72] = 1.
+		trigger = Trigger(Trigger.PULSE, level=0.5, min_width=4, max_width=10)
+		numpy.testing.assert_array_equal(trigger.process(y, 0), [15])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,75 @@
+"""
+Tests of the Welch spectrum estimate against periodograms computed one
+segment at a time.
+Copyright (C) 2011  Leo Singer
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+
+
+import unittest
+import numpy
+from clutterscope.data import Welch
+
+
+def periodograms(y, nfft, step, sample_rate, window):
+	"""Return the one-sided power spectral density of each segment of y,
+	with its mean removed and multiplied by window."""
+	result = []
+	for i in range(0, len(y) - nfft + 1, step):
+		segment = y[i:i + nfft]
+		spectrum = numpy.abs(numpy.fft.rfft((segment - segment.mean()) * window)) ** 2
+		spectrum /= sample_rate * (window ** 2).sum()
+		spectrum[1:-1] *= 2
+		result.append(spectrum)
+	return numpy.array(result)
+
+
+class TestWelch(unittest.TestCase):
+
+	def setUp(self):
+		random = numpy.random.RandomState(0)
+		self.sample_rate = 256.
+		t = numpy.arange(10000) / self.sample_rate
+		self.y = numpy.sin(2 * numpy.pi * 40. * t) + random.standard_normal(len(t))
+		self.sizes = random.randint(1, 500, size=60)
+
+	def process_in_blocks(self, welch):
+		n = 0
+		i0 = 0
+		for size in self.sizes:
+			n += welch.process(self.y[i0:i0 + size])
+			i0 += size
+		n += welch.process(self.y[i0:])
+		return n
+
+	def test_linear(self):
+		welch = Welch(256, self.sample_rate, overlap=0.5)
+		expected = periodograms(self.y, 256, 128, self.sample_rate, numpy.hanning(256))
+		self.assertEqual(self.process_in_blocks(welch), len(expected))
+		self.assertEqual(welch.count, len(expected))
+		numpy.testing.assert_allclose(welch.psd, expected.mean(axis=0), rtol=1e-10)
+		numpy.testing.assert_allclose(welch.freqs, numpy.arange(129) * self.sample_rate / 256)
+		# The sinusoid stands out at its frequency.
+		self.assertEqual(welch.freqs[numpy.argmax(welch.psd)], 40.)
+
+	def test_exponential(self):
+		alpha = 0.05
+		welch = Welch(128, self.sample_rate, overlap=0.25,
+			averaging=Welch.EXPONENTIAL, alpha=alpha)
+		expected = periodograms(self.y, 128, 96, self.sample_rate, numpy.hanning(128))
+		self.assertEqual(self.process_in_blocks(welch), len(expected))
+		psd = expected[0]
+		for spectrum in expected[1:]:
+			psd = (1 - alpha) * psd + alpha * spectrum
+		numpy.testing.assert_allclose(welch.psd, psd, rtol=1e-10)
+
+	def test_white_noise(self):
+		"""The density of white noise of unit variance is 2 / sample_rate."""
+		y = numpy.random.RandomState(1).standard_normal(1 << 18)
+		welch = Welch(512, self.sample_rate)
+		welch.process(y)
+		self.assertAlmostEqual(welch.psd[1:-1].mean() * self.sample_rate / 2, 1., places=2)
+
+
+if __name__ == '__main__':
+	unittest.main()